@@ -2,7 +2,7 @@ import asyncio
 import json
 import math
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 
 from aiokafka import AIOKafkaProducer
 from aiokafka.errors import KafkaConnectionError
@@ -114,7 +114,7 @@ async def shutdown():
 @app.post("/gps")
 async def receive_gps(gps_data: GPSPoint):
     vehicle_id = gps_data.vehicle_id
-    current_time = datetime.now()
+    current_time = datetime.now(timezone.utc)
 
     # Расчет скорости если есть предыдущая точка
     calculated_speed = 0.0
@@ -0,0 +1,1219 @@
+import multiprocessing
+import sys
+from datetime import date, datetime
+from datetime import timezone as dt_timezone
+from io import StringIO
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.reports.services import VehicleMileageReport
+from apps.tracking import partitions
+from apps.tracking.consumers.batching import GPSPointBatchWriter
+from apps.tracking.consumers.vehicle_cache import VehicleIdCache
+from apps.tracking.encoding import (
+    BINARY_COORDINATE_FACTOR,
+    BINARY_TRACK_HEADER,
+    BINARY_TRACK_MAGIC,
+    BINARY_TRACK_RECORD,
+    encode_polyline,
+    encode_polyline_track,
+    pack_binary_track,
+)
+from apps.tracking.geocoding import (
+    CircuitBreaker,
+    FakeGeocodingProvider,
+    GeocodingClient,
+    geocode_pending_trips,
+)
+from apps.tracking.geometry import haversine_km, track_length_km
+from apps.tracking.models import (
+    GeocodedLocation,
+    Trip,
+    VehicleDailyStats,
+    VehicleGPSPoint,
+)
+from apps.tracking.pagination import GPSPointCursorPagination
+from apps.tracking.serializers import (
+    GeoJSONVehicleGPSPointSerializer,
+    GeoJSONVehicleGPSPointValuesSerializer,
+    VehicleGPSPointSerializer,
+    VehicleGPSPointValuesSerializer,
+)
+from apps.tracking.services import (
+    calculate_trip_stats,
+    refresh_vehicle_daily_stats,
+)
+from apps.tracking.simplification import (
+    filter_simplified_points,
+    get_simplified_point_ids,
+)
+from apps.tracking.tiles import get_tile_periods
+from apps.vehicles.models import Vehicle
+from core.management.commands import run_gps_consumers
+from integration_tests.factories import (
+    EnterpriseFactory,
+    VehicleFactory,
+    VehicleGPSPointFactory,
+)
+
+
+def exit_with_error(name):
+    sys.exit(3)
+
+
+def create_trip_with_points(start_time=None, vehicle=None, hours_ago=2):
+    if vehicle is None:
+        vehicle = VehicleFactory()
+    if start_time is None:
+        start_time = timezone.now() - timezone.timedelta(hours=hours_ago)
+    end_time = start_time + timezone.timedelta(hours=1)
+    VehicleGPSPointFactory(
+        vehicle=vehicle, point=Point(37.6, 55.7), created_at=start_time
+    )
+    VehicleGPSPointFactory(
+        vehicle=vehicle, point=Point(37.7, 55.8), created_at=end_time
+    )
+    return Trip.objects.create(
+        vehicle=vehicle, start_time=start_time, end_time=end_time
+    )
+
+
+def login_superuser(api_client):
+    user = get_user_model().objects.create_superuser(
+        username="admin", password="testpass123"
+    )
+    refresh = RefreshToken.for_user(user)
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+
+@pytest.mark.django_db
+class TestGPSPointBatchWriter:
+
+    def get_message(self, vehicle_id, **fields):
+        return {
+            "vehicle_id": vehicle_id,
+            "latitude": 55.7,
+            "longitude": 37.6,
+            **fields,
+        }
+
+    def test_flush_by_size(self):
+        """Пачка пишется по достижении размера одним bulk_create"""
+        vehicle = VehicleFactory()
+        writer = GPSPointBatchWriter(
+            {vehicle.id},
+            lambda *args: None,
+            max_batch_size=2,
+            max_batch_interval=60,
+        )
+
+        writer.add(self.get_message(vehicle.id))
+        assert not writer.is_flush_due()
+        writer.add(self.get_message(vehicle.id))
+        assert writer.is_flush_due()
+
+        assert writer.flush() == 2
+        assert VehicleGPSPoint.objects.filter(vehicle=vehicle).count() == 2
+        assert not writer.is_flush_due()
+
+    def test_flush_by_interval(self):
+        """Неполная пачка пишется по таймауту"""
+        vehicle = VehicleFactory()
+        writer = GPSPointBatchWriter(
+            {vehicle.id}, lambda *args: None, max_batch_interval=0
+        )
+        assert not writer.is_flush_due()
+
+        writer.add(self.get_message(vehicle.id))
+
+        assert writer.is_flush_due()
+
+    def test_rejected_messages_go_to_dead_letter(self):
+        """Битые сообщения и неизвестные автомобили в БД не пишутся"""
+        vehicle = VehicleFactory()
+        dead_letters = []
+        writer = GPSPointBatchWriter(
+            {vehicle.id},
+            lambda data, reason: dead_letters.append(reason),
+            max_batch_interval=0,
+        )
+
+        assert not writer.add(self.get_message(vehicle.id, latitude="north"))
+        assert not writer.add(self.get_message(vehicle.id + 1000))
+        assert not writer.add({"latitude": 55.7})
+
+        assert len(writer) == 0
+        assert len(dead_letters) == 3
+        assert dead_letters[1] == "vehicle not found"
+        # Отклоненные сообщения тоже нужно закоммитить
+        assert writer.is_flush_due()
+        assert writer.flush() == 0
+
+    def test_device_time_and_speed(self):
+        """Время фиксации и скорость точки берутся из сообщения"""
+        vehicle = VehicleFactory()
+        writer = GPSPointBatchWriter({vehicle.id}, lambda *args: None)
+
+        writer.add(
+            self.get_message(
+                vehicle.id,
+                timestamp="2024-03-10T13:00:00+03:00",
+                calculated_speed="42.5",
+            )
+        )
+        # Время без зоны считается UTC, скорости может не быть
+        writer.add(
+            self.get_message(vehicle.id, timestamp="2024-03-10T10:00:30")
+        )
+        assert not writer.add(
+            self.get_message(vehicle.id, timestamp="yesterday")
+        )
+        writer.flush()
+
+        points = VehicleGPSPoint.objects.filter(vehicle=vehicle).order_by(
+            "created_at"
+        )
+        assert [point.created_at for point in points] == [
+            datetime(2024, 3, 10, 10, tzinfo=dt_timezone.utc),
+            datetime(2024, 3, 10, 10, 0, 30, tzinfo=dt_timezone.utc),
+        ]
+        assert [point.speed for point in points] == [42.5, None]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_vehicle_deleted_after_cache_check(self):
+        """Точки удаленного в другом процессе автомобиля не ломают пачку"""
+        vehicle, deleted_vehicle = VehicleFactory.create_batch(2)
+        vehicle_ids = {vehicle.id, deleted_vehicle.id}
+        dead_letters = []
+        writer = GPSPointBatchWriter(
+            vehicle_ids,
+            lambda data, reason: dead_letters.append(
+                (data["vehicle_id"], reason)
+            ),
+        )
+        writer.add(self.get_message(vehicle.id))
+        writer.add(self.get_message(deleted_vehicle.id))
+        # Сигналы другого процесса до этого кэша не доходят
+        Vehicle.objects.filter(pk=deleted_vehicle.pk).delete()
+
+        assert writer.flush() == 1
+
+        assert dead_letters == [(deleted_vehicle.id, "vehicle not found")]
+        assert deleted_vehicle.id not in vehicle_ids
+        assert VehicleGPSPoint.objects.get().vehicle_id == vehicle.id
+
+
+@pytest.mark.django_db
+class TestVehicleIdCache:
+
+    def test_miss_refreshes_cache(self):
+        """Автомобиль из другого процесса находится перечитыванием"""
+        cache = VehicleIdCache(miss_refresh_interval=0)
+        cache.refresh()
+
+        vehicle = VehicleFactory()
+
+        assert vehicle.id in cache
+
+    def test_miss_refresh_is_throttled(self):
+        """Промахи не перечитывают кэш чаще интервала"""
+        cache = VehicleIdCache(miss_refresh_interval=60)
+        cache.refresh()
+
+        vehicle = VehicleFactory()
+
+        assert vehicle.id not in cache
+
+    def test_discard_forces_refresh(self):
+        """После удаления id кэш перечитывается без ожидания интервала"""
+        deleted_vehicle = VehicleFactory()
+        cache = VehicleIdCache(miss_refresh_interval=60)
+        cache.refresh()
+        vehicle = VehicleFactory()
+        Vehicle.objects.filter(pk=deleted_vehicle.pk).delete()
+
+        cache.discard(deleted_vehicle.id)
+
+        assert deleted_vehicle.id not in cache
+        assert vehicle.id in cache
+
+    def test_signals_update_cache(self):
+        """Изменения в этом же процессе применяются без запросов"""
+        cache = VehicleIdCache(miss_refresh_interval=60)
+        cache.refresh()
+        cache.connect_signals()
+        try:
+            vehicle = VehicleFactory()
+            assert vehicle.id in cache.vehicle_ids
+
+            vehicle_id = vehicle.id
+            vehicle.delete()
+            assert vehicle_id not in cache.vehicle_ids
+        finally:
+            post_save.disconnect(
+                sender=Vehicle,
+                dispatch_uid=f"vehicle_id_cache_save_{id(cache)}",
+            )
+            post_delete.disconnect(
+                sender=Vehicle,
+                dispatch_uid=f"vehicle_id_cache_delete_{id(cache)}",
+            )
+
+
+class TestGPSConsumerPool:
+
+    def get_command(self, monkeypatch):
+        # Вместо консьюмера Kafka процесс сразу завершается с ошибкой
+        monkeypatch.setattr(run_gps_consumers, "run_worker", exit_with_error)
+        command = run_gps_consumers.Command(stdout=StringIO())
+        command.context = multiprocessing.get_context("fork")
+        command.stopping = False
+        command.workers = {}
+        return command
+
+    def test_exited_worker_is_restarted(self, monkeypatch):
+        """Завершившийся процесс запускается заново под тем же именем"""
+        command = self.get_command(monkeypatch)
+        command.start_worker("gps-consumer-0")
+        exited_process = command.workers["gps-consumer-0"]
+        exited_process.join()
+
+        command.restart_exited_workers()
+
+        restarted_process = command.workers["gps-consumer-0"]
+        restarted_process.join()
+        assert restarted_process is not exited_process
+        assert "gps-consumer-0 exited with code 3, restarting" in (
+            command.stdout.getvalue()
+        )
+
+    def test_no_restart_after_stop(self, monkeypatch):
+        """После сигнала остановки процессы не перезапускаются"""
+        command = self.get_command(monkeypatch)
+        command.start_worker("gps-consumer-0")
+        exited_process = command.workers["gps-consumer-0"]
+        exited_process.join()
+        command.stop()
+
+        command.restart_exited_workers()
+
+        assert command.workers["gps-consumer-0"] is exited_process
+
+
+@pytest.mark.django_db
+class TestGPSPointsBenchmark:
+
+    def test_points_are_rolled_back(self):
+        """Замер выводит все выборки и не оставляет точек в БД"""
+        VehicleFactory()
+        stdout = StringIO()
+
+        call_command(
+            "benchmark_gps_points", points=100, batch_size=30, stdout=stdout
+        )
+
+        output = stdout.getvalue()
+        assert "Insert: 100 points" in output
+        for scan in ("Vehicle day range", "Fleet hour range", "Proximity"):
+            assert scan in output
+        assert not VehicleGPSPoint.objects.exists()
+
+
+@pytest.mark.django_db
+class TestTripStats:
+
+    def test_stats_are_saved_with_trip(self):
+        """Пробег, количество точек и скорости считаются при сохранении"""
+        vehicle = VehicleFactory()
+        start_time = datetime(2024, 3, 10, 10, tzinfo=dt_timezone.utc)
+        # Градус меридиана за два часа
+        for index, (lat, speed) in enumerate([(55, 40), (55.5, 70), (56, 50)]):
+            VehicleGPSPointFactory(
+                vehicle=vehicle,
+                point=Point(37.6, lat),
+                created_at=start_time + timezone.timedelta(hours=index),
+                speed=speed,
+            )
+
+        trip = Trip.objects.create(
+            vehicle=vehicle,
+            start_time=start_time,
+            end_time=start_time + timezone.timedelta(hours=2),
+        )
+
+        trip.refresh_from_db()
+        assert trip.point_count == 3
+        assert trip.distance_km == pytest.approx(111.19, abs=0.01)
+        assert trip.max_speed == 70
+        assert trip.avg_speed == pytest.approx(55.6, abs=0.01)
+
+
+class TestTrackLength:
+
+    def test_haversine_known_distances(self):
+        """Расстояния без PostGIS совпадают с известными значениями"""
+        # Градус меридиана и градус экватора на сфере радиусом 6371 км
+        assert haversine_km(37.6, 55, 37.6, 56) == pytest.approx(
+            111.195, abs=1e-3
+        )
+        assert haversine_km(0, 0, 1, 0) == pytest.approx(111.195, abs=1e-3)
+        # На 60-й параллели градус долготы вдвое короче
+        assert haversine_km(0, 60, 1, 60) == pytest.approx(55.6, abs=0.01)
+        # Минута дуги меридиана - морская миля
+        assert haversine_km(0, 0, 0, 1 / 60) == pytest.approx(1.852, rel=1e-3)
+        # Москва - Санкт-Петербург по дуге большого круга
+        assert haversine_km(
+            37.6173, 55.7558, 30.3351, 59.9343
+        ) == pytest.approx(633, abs=1)
+
+    @pytest.mark.django_db
+    def test_trip_distance_on_sqlite(self):
+        """SpatiaLite считает пробег поездки в Python по тем же точкам"""
+        vehicle = VehicleFactory()
+        start_time = datetime(2024, 3, 10, 10, tzinfo=dt_timezone.utc)
+        coordinates = [(37.6, 55.7), (37.65, 55.72), (37.7, 55.75)]
+        for index, (lng, lat) in enumerate(coordinates):
+            VehicleGPSPointFactory(
+                vehicle=vehicle,
+                point=Point(lng, lat),
+                created_at=start_time + timezone.timedelta(minutes=index),
+            )
+        trip = Trip.objects.create(
+            vehicle=vehicle,
+            start_time=start_time,
+            end_time=start_time + timezone.timedelta(minutes=2),
+        )
+
+        stats = calculate_trip_stats(trip)
+
+        assert stats["distance_km"] == pytest.approx(
+            track_length_km(coordinates)
+        )
+        assert stats["point_count"] == 3
+
+
+@pytest.mark.django_db
+class TestTripGeocoding:
+
+    def test_geocode_pending_trips(self):
+        """Адреса поездки сохраняются в поездке"""
+        trip = create_trip_with_points()
+        assert trip.geocoded_at is None
+
+        assert geocode_pending_trips(provider=FakeGeocodingProvider()) == 1
+
+        trip.refresh_from_db()
+        assert trip.start_address == "55.70000, 37.60000"
+        assert trip.end_address == "55.80000, 37.70000"
+        assert trip.geocoded_at is not None
+        assert geocode_pending_trips(provider=FakeGeocodingProvider()) == 0
+
+    def test_failed_trips_stay_pending(self):
+        """При ошибке провайдера поездка остается в очереди"""
+        trip = create_trip_with_points()
+
+        provider = FakeGeocodingProvider(is_down=True)
+        assert geocode_pending_trips(provider=provider) == 0
+
+        trip.refresh_from_db()
+        assert trip.geocoded_at is None
+        assert trip.start_address is None
+
+    def test_failed_trips_are_deferred(self):
+        """Поездка с ошибкой не выбирается снова до geocode_retry_at"""
+        trip = create_trip_with_points()
+        geocode_pending_trips(provider=FakeGeocodingProvider(is_down=True))
+
+        trip.refresh_from_db()
+        assert trip.geocode_attempts == 1
+        assert trip.geocode_retry_at > timezone.now()
+        assert geocode_pending_trips(provider=FakeGeocodingProvider()) == 0
+
+        Trip.objects.filter(pk=trip.pk).update(geocode_retry_at=None)
+        assert geocode_pending_trips(provider=FakeGeocodingProvider()) == 1
+
+    def test_geocoded_locations_are_shared(self):
+        """Провайдер вызывается один раз на место, даже между пачками"""
+        create_trip_with_points(hours_ago=4)
+        provider = FakeGeocodingProvider()
+        geocode_pending_trips(provider=provider)
+        create_trip_with_points(hours_ago=2)
+
+        assert geocode_pending_trips(provider=provider) == 1
+        assert len(provider.calls) == 2
+        assert GeocodedLocation.objects.count() == 2
+
+
+class TestGeocodingClient:
+
+    def test_circuit_breaker_skips_provider_when_down(self):
+        """После серии ошибок провайдер не вызывается"""
+        provider = FakeGeocodingProvider(is_down=True)
+        client = GeocodingClient(
+            provider, CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        )
+
+        for _ in range(5):
+            assert client.reverse(55.7, 37.6) is None
+        assert len(provider.calls) == 2
+
+
+@pytest.mark.django_db
+class TestGPSPointTiles:
+
+    def get_url(self, z, x, y):
+        return reverse(
+            "tracking_api:gps_point_tiles", kwargs={"z": z, "x": x, "y": y}
+        )
+
+    def test_tile_out_of_range(self, api_client):
+        """Координаты тайла вне сетки масштаба"""
+        login_superuser(api_client)
+
+        response = api_client.get(
+            self.get_url(1, 2, 0),
+            {"start_date": "2024-01-01", "end_date": "2024-01-02"},
+        )
+
+        assert response.status_code == 400
+
+    def test_start_date_after_end_date(self, api_client):
+        """Период проверяется до обращения к БД"""
+        login_superuser(api_client)
+
+        response = api_client.get(
+            self.get_url(0, 0, 0),
+            {"start_date": "2024-01-02", "end_date": "2024-01-01"},
+        )
+
+        assert response.status_code == 400
+
+    @pytest.mark.skipif(
+        connection.vendor == "postgresql", reason="SpatiaLite only"
+    )
+    def test_tiles_require_postgresql(self, api_client):
+        """Тестовая БД - SpatiaLite, тайлы строит только PostGIS"""
+        login_superuser(api_client)
+
+        response = api_client.get(
+            self.get_url(0, 0, 0),
+            {"start_date": "2024-01-01", "end_date": "2024-01-02"},
+        )
+
+        assert response.status_code == 501
+
+    @pytest.mark.skipif(
+        connection.vendor != "postgresql", reason="PostgreSQL only"
+    )
+    def test_empty_tile(self, api_client):
+        """Тайл без точек - пустой ответ, а не ошибка"""
+        login_superuser(api_client)
+        EnterpriseFactory()
+
+        response = api_client.get(
+            self.get_url(0, 0, 0),
+            {"start_date": "2024-01-01", "end_date": "2024-01-02"},
+        )
+
+        assert response.status_code == 200
+        assert response.content == b""
+
+    def test_period_is_localised_per_enterprise(self):
+        """Сутки каждого предприятия начинаются в его часовом поясе"""
+        moscow = EnterpriseFactory(timezone="Europe/Moscow")
+        vladivostok = EnterpriseFactory(timezone="Asia/Vladivostok")
+        EnterpriseFactory(timezone="America/New_York")
+
+        periods = get_tile_periods(
+            date(2024, 1, 1), date(2024, 1, 2), [moscow.id, vladivostok.id]
+        )
+
+        assert {
+            timezone_name: (
+                start.astimezone(dt_timezone.utc),
+                end.astimezone(dt_timezone.utc),
+            )
+            for timezone_name, (start, end) in periods.items()
+        } == {
+            "Europe/Moscow": (
+                datetime(2023, 12, 31, 21, tzinfo=dt_timezone.utc),
+                datetime(2024, 1, 2, 21, tzinfo=dt_timezone.utc),
+            ),
+            "Asia/Vladivostok": (
+                datetime(2023, 12, 31, 14, tzinfo=dt_timezone.utc),
+                datetime(2024, 1, 2, 14, tzinfo=dt_timezone.utc),
+            ),
+        }
+
+    def test_manager_without_enterprises_has_no_periods(self):
+        """Менеджеру без предприятий не видны точки ни одного пояса"""
+        EnterpriseFactory()
+
+        assert get_tile_periods(date(2024, 1, 1), date(2024, 1, 2), []) == {}
+
+
+@pytest.mark.django_db
+class TestVehicleMileageReport:
+
+    def test_live_day_uses_rolled_up_week_start(self):
+        """Сегодняшний день попадает в ту же неделю, что и свертка"""
+        report = VehicleMileageReport(
+            date(2025, 12, 1), date(2026, 1, 31), period="week"
+        )
+        week_start = report.truncate_to_period(date(2026, 1, 1))
+
+        assert week_start == date(2025, 12, 29)
+        assert report.get_period_key(week_start) == report.get_period_key(
+            date(2025, 12, 29)
+        )
+
+    def test_enterprise_report_is_grouped(self, django_assert_num_queries):
+        """Пробег всех автомобилей предприятия по дням его часового пояса"""
+        enterprise = EnterpriseFactory(timezone="Europe/Moscow")
+        vehicle, idle_vehicle = VehicleFactory.create_batch(
+            2, enterprise=enterprise
+        )
+        # 22:30 UTC 10 марта - уже 11 марта по Москве
+        night_trip = create_trip_with_points(
+            start_time=datetime(2024, 3, 10, 22, 30, tzinfo=dt_timezone.utc),
+            vehicle=vehicle,
+        )
+        morning_trip = create_trip_with_points(
+            start_time=datetime(2024, 3, 11, 6, tzinfo=dt_timezone.utc),
+            vehicle=vehicle,
+        )
+        report = VehicleMileageReport(
+            date(2024, 3, 1), date(2024, 3, 31), enterprise=enterprise
+        )
+
+        # Автомобили и пробег - по одному запросу на весь отчет
+        with django_assert_num_queries(2):
+            result = report.generate()
+
+        mileage = night_trip.distance_km + morning_trip.distance_km
+        periods = result["data"][vehicle.car_number]["periods"]
+        assert list(periods) == ["2024-03-11"]
+        assert periods["2024-03-11"]["value"] == pytest.approx(mileage)
+        assert result["data"][idle_vehicle.car_number]["total"] == 0
+        assert result["totals"]["mileage_km"] == pytest.approx(mileage)
+
+    def test_total_after_trip_edit(self):
+        """Отчет за прошлые дни видит изменение поездки"""
+        start_time = datetime(2024, 3, 10, 10, tzinfo=dt_timezone.utc)
+        trip = create_trip_with_points(start_time=start_time)
+        VehicleGPSPointFactory(
+            vehicle=trip.vehicle,
+            point=Point(37.8, 55.9),
+            created_at=trip.end_time + timezone.timedelta(minutes=30),
+        )
+        report = VehicleMileageReport(
+            date(2024, 3, 1), date(2024, 3, 31), vehicle=trip.vehicle
+        )
+        distance_before = report.generate()["totals"]["mileage_km"]
+
+        trip.end_time += timezone.timedelta(hours=1)
+        trip.save()
+
+        mileage = report.generate()["totals"]["mileage_km"]
+        assert distance_before > 0
+        assert mileage > distance_before
+        assert mileage == pytest.approx(trip.distance_km)
+
+
+@pytest.mark.django_db
+class TestVehicleDailyStats:
+
+    def test_trip_moved_to_another_day(self):
+        """После переноса поездки прежний день пересчитывается"""
+        start_time = datetime(2024, 3, 10, 10, tzinfo=dt_timezone.utc)
+        trip = create_trip_with_points(start_time=start_time)
+        assert VehicleDailyStats.objects.get(
+            vehicle=trip.vehicle, date=date(2024, 3, 10)
+        ).distance_km == pytest.approx(trip.distance_km)
+
+        trip.start_time = start_time - timezone.timedelta(days=1)
+        trip.save()
+
+        stats = VehicleDailyStats.objects.get(vehicle=trip.vehicle)
+        assert stats.date == date(2024, 3, 9)
+        assert stats.distance_km == pytest.approx(trip.distance_km)
+
+    def test_refresh_rebuilds_from_trips(self):
+        """Свертка пересчитывается из поездок за период"""
+        start_time = datetime(2024, 3, 10, 10, tzinfo=dt_timezone.utc)
+        trip = create_trip_with_points(start_time=start_time)
+        VehicleDailyStats.objects.all().delete()
+
+        saved_count = refresh_vehicle_daily_stats(
+            date(2024, 3, 10), date(2024, 3, 10)
+        )
+
+        stats = VehicleDailyStats.objects.get(vehicle=trip.vehicle)
+        assert saved_count == 1
+        assert stats.trip_count == 1
+        assert stats.moving_time == timezone.timedelta(hours=1)
+
+    def test_refresh_updates_rows_in_place(self):
+        """Пересчет обновляет строки дней с поездками и удаляет остальные"""
+        start_time = datetime(2024, 3, 10, 10, tzinfo=dt_timezone.utc)
+        trip = create_trip_with_points(start_time=start_time)
+        stats = VehicleDailyStats.objects.get(vehicle=trip.vehicle)
+        VehicleDailyStats.objects.filter(pk=stats.pk).update(distance_km=0)
+        VehicleDailyStats.objects.create(
+            vehicle=trip.vehicle,
+            date=date(2024, 3, 11),
+            distance_km=5,
+            trip_count=1,
+            moving_time=timezone.timedelta(hours=1),
+        )
+
+        refresh_vehicle_daily_stats(date(2024, 3, 10), date(2024, 3, 11))
+
+        assert list(VehicleDailyStats.objects.values_list("pk", "date")) == [
+            (stats.pk, date(2024, 3, 10))
+        ]
+        stats.refresh_from_db()
+        assert stats.distance_km == pytest.approx(trip.distance_km)
+
+
+@pytest.mark.django_db
+class TestTripTracksAPI:
+
+    def test_only_points_inside_trips(self, api_client):
+        """В треки попадают только точки из интервалов поездок"""
+        login_superuser(api_client)
+        vehicle = VehicleFactory()
+        day_start = datetime(2024, 3, 10, tzinfo=dt_timezone.utc)
+        longitudes = [37.08, 37.09, 37.1, 37.11, 37.12, 37.13, 37.14, 37.15]
+        for hour, lng in enumerate(longitudes, start=8):
+            VehicleGPSPointFactory(
+                vehicle=vehicle,
+                point=Point(lng, 55.7),
+                created_at=day_start + timezone.timedelta(hours=hour),
+            )
+        # Поездки 9:00-11:00 и 13:00-14:00, точки 8:00, 12:00 и 15:00 вне их
+        for start_hour, end_hour in ((9, 11), (13, 14)):
+            Trip.objects.create(
+                vehicle=vehicle,
+                start_time=day_start + timezone.timedelta(hours=start_hour),
+                end_time=day_start + timezone.timedelta(hours=end_hour),
+            )
+
+        response = api_client.get(
+            reverse("tracking_api:trips_tracks-list"),
+            {
+                "vehicle_id": vehicle.id,
+                "start_date": "2024-03-10T00:00:00",
+                "end_date": "2024-03-10T23:59:59",
+            },
+        )
+
+        assert response.status_code == 200
+        assert [
+            point["point"]["coordinates"][0] for point in response.json()
+        ] == [
+            37.09,
+            37.1,
+            37.11,
+            37.13,
+            37.14,
+        ]
+
+
+@pytest.mark.django_db
+class TestGPSPointsStreaming:
+
+    @pytest.mark.parametrize("output_format", ["json", "geojson"])
+    def test_stream_matches_response(
+        self, api_client, settings, output_format
+    ):
+        """Потоковый ответ побайтно совпадает с обычным"""
+        # Несколько пачек, чтобы проверить запятые между ними
+        settings.GPS_POINTS_STREAM_CHUNK_SIZE = 2
+        login_superuser(api_client)
+        vehicle = VehicleFactory(enterprise__timezone="Europe/Moscow")
+        created_at = datetime(2024, 3, 10, 10, tzinfo=dt_timezone.utc)
+        for index, lng in enumerate([37.6, 37.61, 37.62, 37.63, 37.64]):
+            VehicleGPSPointFactory(
+                vehicle=vehicle,
+                point=Point(lng, 55.7),
+                created_at=created_at + timezone.timedelta(minutes=index),
+            )
+        url = reverse("tracking_api:vehicle_gps_points-list")
+        params = {
+            "vehicle_id": vehicle.id,
+            "start_date": "2024-03-10",
+            "end_date": "2024-03-10",
+            "output_format": output_format,
+        }
+
+        response = api_client.get(url, params)
+        streamed_response = api_client.get(url, {**params, "stream": "true"})
+
+        assert response.status_code == 200
+        assert streamed_response.streaming
+        assert (
+            b"".join(streamed_response.streaming_content) == response.content
+        )
+
+
+@pytest.mark.django_db
+class TestKeysetCursorPagination:
+
+    def get_page(self, params):
+        paginator = GPSPointCursorPagination()
+        request = Request(APIRequestFactory().get("/", params))
+        page = paginator.paginate_queryset(
+            VehicleGPSPoint.objects.all(), request
+        )
+        next_link = paginator.get_next_link()
+        cursor = None
+        if next_link is not None:
+            cursor = parse_qs(urlparse(next_link).query)["cursor"][0]
+        return [point.id for point in page], cursor
+
+    def test_walk_points_with_same_time(self):
+        """Точки с одинаковым временем не теряются и не повторяются"""
+        vehicle = VehicleFactory()
+        created_at = datetime(2024, 3, 10, 10, tzinfo=dt_timezone.utc)
+        point_ids = [
+            VehicleGPSPointFactory(vehicle=vehicle, created_at=created_at).id
+            for _ in range(5)
+        ]
+
+        first_page, cursor = self.get_page({"page_size": 2})
+        second_page, cursor = self.get_page({"page_size": 2, "cursor": cursor})
+        third_page, cursor = self.get_page({"page_size": 2, "cursor": cursor})
+
+        assert first_page + second_page + third_page == sorted(point_ids)
+        assert len(third_page) == 1
+        assert cursor is None
+
+    def test_invalid_cursor(self):
+        """Испорченный курсор - 404, а не ошибка сервера"""
+        with pytest.raises(NotFound):
+            self.get_page({"cursor": "not-a-cursor"})
+
+
+class TestTrackEncoding:
+
+    # Пример из документации Google Encoded Polyline Algorithm Format
+    GOOGLE_COORDINATES = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    GOOGLE_POLYLINE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+    def get_rows(self):
+        created_at = datetime(2024, 3, 10, 10, tzinfo=dt_timezone.utc)
+        return [
+            (
+                Point(lng, lat),
+                created_at + timezone.timedelta(seconds=index * 30),
+                7,
+            )
+            for index, (lat, lng) in enumerate(self.GOOGLE_COORDINATES)
+        ]
+
+    def test_polyline_matches_google_example(self):
+        """Кодирование совпадает с эталонной строкой Google"""
+        assert encode_polyline(self.GOOGLE_COORDINATES) == self.GOOGLE_POLYLINE
+
+    def test_polyline_track(self):
+        """Время передается разностями: первая 0, дальше по 30 секунд"""
+        track = encode_polyline_track(self.get_rows())
+
+        assert track["polyline"] == self.GOOGLE_POLYLINE
+        # Разности 0, 30, 30 в кодировке polyline
+        assert track["timestamps"] == "?{@{@"
+        assert track["start_timestamp"] == 1710064800
+        assert track["point_count"] == 3
+
+    def test_binary_track_layout(self):
+        """Заголовок и записи фиксированной длины"""
+        rows = self.get_rows()
+        data = pack_binary_track(rows, len(rows))
+
+        assert len(data) == (
+            BINARY_TRACK_HEADER.size + BINARY_TRACK_RECORD.size * len(rows)
+        )
+        magic, _, count = BINARY_TRACK_HEADER.unpack_from(data)
+        assert (magic, count) == (BINARY_TRACK_MAGIC, 3)
+        timestamp_ms, lat, lng, trip_id = BINARY_TRACK_RECORD.unpack_from(
+            data, BINARY_TRACK_HEADER.size + BINARY_TRACK_RECORD.size
+        )
+        assert timestamp_ms == 1710064830000
+        assert lat == round(40.7 * BINARY_COORDINATE_FACTOR)
+        assert lng == round(-120.95 * BINARY_COORDINATE_FACTOR)
+        assert trip_id == 7
+
+
+@pytest.mark.django_db
+class TestGPSPointValuesSerializer:
+
+    @pytest.mark.parametrize(
+        "serializer_class, values_serializer_class",
+        [
+            (VehicleGPSPointSerializer, VehicleGPSPointValuesSerializer),
+            (
+                GeoJSONVehicleGPSPointSerializer,
+                GeoJSONVehicleGPSPointValuesSerializer,
+            ),
+        ],
+    )
+    def test_output_matches_drf(
+        self, serializer_class, values_serializer_class
+    ):
+        """Быстрый сериализатор дает тот же JSON, что и сериализатор DRF"""
+        vehicle = VehicleFactory(enterprise__timezone="Europe/Moscow")
+        created_at = datetime(2024, 3, 10, 10, 0, 0, 250000, dt_timezone.utc)
+        for index, lng in enumerate([37.6, 37.65, 37.7]):
+            VehicleGPSPointFactory(
+                vehicle=vehicle,
+                point=Point(lng, 55.7),
+                created_at=created_at + timezone.timedelta(minutes=index),
+            )
+        points = VehicleGPSPoint.objects.filter(vehicle=vehicle).order_by(
+            "created_at"
+        )
+        values_serializer = values_serializer_class.for_vehicle(vehicle.id)
+        renderer = JSONRenderer()
+
+        expected = renderer.render(serializer_class(points, many=True).data)
+
+        assert renderer.render(values_serializer.serialize(points)) == expected
+        assert (
+            renderer.render(values_serializer.serialize_objects(points))
+            == expected
+        )
+
+
+@pytest.mark.django_db
+class TestLatePointsLinking:
+
+    def test_late_point_is_linked_to_trip(self):
+        """Точка, пришедшая после сохранения поездки, попадает в ее трек"""
+        trip = create_trip_with_points()
+        late_at = trip.start_time + timezone.timedelta(minutes=30)
+        writer = GPSPointBatchWriter({trip.vehicle_id}, lambda *args: None)
+
+        writer.add(
+            {
+                "vehicle_id": trip.vehicle_id,
+                "latitude": 55.75,
+                "longitude": 37.65,
+                "timestamp": late_at.isoformat(),
+            }
+        )
+        writer.flush()
+
+        trip.refresh_from_db()
+        assert trip.gps_points.filter(created_at=late_at).exists()
+        assert trip.point_count == 3
+
+    def test_late_first_point_resets_addresses(self):
+        """Опоздавшая точка в начале трека меняет начало поездки"""
+        vehicle = VehicleFactory()
+        start_time = timezone.now() - timezone.timedelta(hours=2)
+        for minutes, lng in ((10, 37.6), (50, 37.7)):
+            VehicleGPSPointFactory(
+                vehicle=vehicle,
+                point=Point(lng, 55.7),
+                created_at=start_time + timezone.timedelta(minutes=minutes),
+            )
+        trip = Trip.objects.create(
+            vehicle=vehicle,
+            start_time=start_time,
+            end_time=start_time + timezone.timedelta(hours=1),
+        )
+        Trip.objects.filter(pk=trip.pk).update(
+            start_address="Москва",
+            end_address="Москва",
+            geocoded_at=timezone.now(),
+        )
+        late_at = start_time + timezone.timedelta(minutes=5)
+        writer = GPSPointBatchWriter({vehicle.id}, lambda *args: None)
+
+        writer.add(
+            {
+                "vehicle_id": vehicle.id,
+                "latitude": 55.7,
+                "longitude": 37.55,
+                "timestamp": late_at.isoformat(),
+            }
+        )
+        writer.flush()
+
+        trip.refresh_from_db()
+        assert trip.start_point.created_at == late_at
+        assert trip.start_address is None
+        assert trip.end_address is None
+        assert trip.geocoded_at is None
+
+
+@pytest.mark.django_db
+class TestTrackSimplification:
+
+    def test_short_trip_keeps_endpoints(self):
+        """Поездка меньше допуска не пропадает, остаются ее концы"""
+        vehicle = VehicleFactory()
+        start_time = timezone.now() - timezone.timedelta(hours=2)
+        points = [
+            VehicleGPSPointFactory(
+                vehicle=vehicle,
+                point=Point(37.6 + index * 0.0001, 55.7),
+                created_at=start_time + timezone.timedelta(minutes=index),
+            )
+            for index in range(3)
+        ]
+        trip = Trip.objects.create(
+            vehicle=vehicle,
+            start_time=start_time,
+            end_time=start_time + timezone.timedelta(minutes=2),
+        )
+
+        point_ids = get_simplified_point_ids([trip], 100_000)
+
+        assert sorted(point_ids) == [points[0].id, points[-1].id]
+
+    def test_tolerance_depends_on_latitude(self):
+        """Допуск в метрах учитывает сужение градуса долготы к полюсам"""
+        vehicle = VehicleFactory()
+        start_time = timezone.now() - timezone.timedelta(hours=2)
+        # Средняя точка отходит от меридиана на 0.0003 градуса долготы:
+        # 33 м на экваторе, но около 17 м на 60-й параллели
+        points = [
+            VehicleGPSPointFactory(
+                vehicle=vehicle,
+                point=Point(lng, lat),
+                created_at=start_time + timezone.timedelta(minutes=index),
+            )
+            for index, (lng, lat) in enumerate(
+                [(30.0, 60.0), (30.0003, 60.001), (30.0, 60.002)]
+            )
+        ]
+        trip = Trip.objects.create(
+            vehicle=vehicle,
+            start_time=start_time,
+            end_time=start_time + timezone.timedelta(minutes=2),
+        )
+
+        assert sorted(get_simplified_point_ids([trip], 25)) == [
+            points[0].id,
+            points[-1].id,
+        ]
+        assert len(get_simplified_point_ids([trip], 10)) == 3
+
+    def test_filter_keeps_points_of_each_trip(self):
+        """Упрощение нескольких поездок одним запросом"""
+        vehicle = VehicleFactory()
+        start_time = timezone.now() - timezone.timedelta(hours=4)
+        trips = []
+        expected_ids = []
+        for trip_index in range(2):
+            trip_start = start_time + timezone.timedelta(hours=trip_index)
+            points = [
+                VehicleGPSPointFactory(
+                    vehicle=vehicle,
+                    point=Point(37.6 + index * 0.0001, 55.7),
+                    created_at=trip_start + timezone.timedelta(minutes=index),
+                )
+                for index in range(3)
+            ]
+            trips.append(
+                Trip.objects.create(
+                    vehicle=vehicle,
+                    start_time=trip_start,
+                    end_time=trip_start + timezone.timedelta(minutes=2),
+                )
+            )
+            expected_ids += [points[0].id, points[-1].id]
+        # Точка вне поездок в упрощенный трек не попадает
+        VehicleGPSPointFactory(
+            vehicle=vehicle,
+            created_at=start_time - timezone.timedelta(hours=1),
+        )
+
+        points = filter_simplified_points(
+            VehicleGPSPoint.objects.filter(vehicle=vehicle),
+            Trip.objects.filter(pk__in=[trip.pk for trip in trips]),
+            100_000,
+        )
+
+        assert sorted(points.values_list("id", flat=True)) == sorted(
+            expected_ids
+        )
+
+
+class TestGPSPointPartitions:
+
+    def test_month_arithmetic(self):
+        """Границы и имена секций считаются по месяцам UTC"""
+        month = partitions.month_start(
+            datetime(2024, 1, 31, 23, tzinfo=dt_timezone.utc)
+        )
+
+        assert month == datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        assert partitions.add_months(month, -1) == datetime(
+            2023, 12, 1, tzinfo=dt_timezone.utc
+        )
+        assert partitions.add_months(month, 13) == datetime(
+            2025, 2, 1, tzinfo=dt_timezone.utc
+        )
+        assert (
+            partitions.partition_name(month)
+            == "tracking_vehiclegpspoint_p2024_01"
+        )
+
+    @pytest.mark.django_db
+    @pytest.mark.skipif(
+        connection.vendor == "postgresql", reason="SpatiaLite only"
+    )
+    def test_command_does_nothing_without_postgresql(self):
+        """Тестовая БД - SpatiaLite, секций в ней нет"""
+        stdout = StringIO()
+
+        call_command("gps_point_partitions", retention_months=6, stdout=stdout)
+
+        assert "only on PostgreSQL" in stdout.getvalue()
+
+    @pytest.mark.django_db
+    @pytest.mark.skipif(
+        connection.vendor != "postgresql", reason="PostgreSQL only"
+    )
+    def test_detached_partition_has_no_foreign_keys(self):
+        """Архивная секция не ссылается на автомобили и поездки"""
+        old_month = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+        partitions.ensure_partitions(months_ahead=0, now=old_month)
+        VehicleGPSPointFactory(created_at=old_month)
+
+        detached = partitions.detach_partitions_before(
+            partitions.add_months(old_month, 1)
+        )
+
+        assert detached == ["tracking_vehiclegpspoint_p2020_01"]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM pg_constraint "
+                "WHERE conrelid = %s::regclass AND contype = 'f'",
+                [detached[0]],
+            )
+            assert cursor.fetchone()[0] == 0
+
+
+@pytest.mark.django_db
+class TestTrackingBackfill:
+
+    def test_points_are_linked_once(self):
+        """Повторный запуск не перебирает уже привязанные поездки"""
+        trip = create_trip_with_points()
+        late_point = VehicleGPSPointFactory(
+            vehicle=trip.vehicle,
+            point=Point(37.65, 55.75),
+            created_at=trip.start_time + timezone.timedelta(minutes=30),
+        )
+        assert late_point.trip_id is None
+        stdout = StringIO()
+
+        call_command("backfill_gps_point_trips", stdout=stdout)
+        call_command("backfill_gps_point_trips", stdout=stdout)
+
+        late_point.refresh_from_db()
+        assert late_point.trip_id == trip.id
+        output = stdout.getvalue()
+        assert "Linked 1 GPS points to 1 trips" in output
+        assert "Linked 0 GPS points to 0 trips" in output
+
+    def test_trip_stats_wait_for_linked_points(self):
+        """Статистика не считается, пока точки не привязаны к поездкам"""
+        trip = create_trip_with_points()
+        VehicleGPSPoint.objects.update(trip=None)
+        Trip.objects.update(distance_km=None, point_count=None)
+
+        with pytest.raises(CommandError, match="backfill_gps_point_trips"):
+            call_command("backfill_trip_stats", stdout=StringIO())
+        call_command("backfill_gps_point_trips", stdout=StringIO())
+        call_command("backfill_trip_stats", stdout=StringIO())
+
+        trip.refresh_from_db()
+        assert trip.point_count == 2
+        assert trip.distance_km > 0
+
+    def test_zero_stats_are_recalculated(self):
+        """Нули от запуска до привязки точек пересчитываются без --all"""
+        trip = create_trip_with_points()
+        distance_km = trip.distance_km
+        Trip.objects.update(distance_km=0, point_count=0)
+
+        call_command("backfill_trip_stats", stdout=StringIO())
+
+        trip.refresh_from_db()
+        assert trip.point_count == 2
+        assert trip.distance_km == pytest.approx(distance_km)
+
+    def test_daily_stats_wait_for_trip_stats(self):
+        """Свертка не строится из поездок без статистики"""
+        trip = create_trip_with_points()
+        Trip.objects.update(distance_km=None, point_count=None)
+
+        with pytest.raises(CommandError, match="backfill_trip_stats"):
+            call_command("refresh_vehicle_daily_stats", stdout=StringIO())
+        call_command("backfill_trip_stats", stdout=StringIO())
+        call_command("refresh_vehicle_daily_stats", stdout=StringIO())
+
+        stats = VehicleDailyStats.objects.get(vehicle=trip.vehicle)
+        assert stats.distance_km == pytest.approx(
+            Trip.objects.get().distance_km
+        )
+
+
+@pytest.mark.django_db
+class TestGPSPointsDownsampling:
+
+    def test_trip_endpoints_are_kept_and_stats_refreshed(self):
+        """Концы поездки остаются, статистика считается по оставшимся"""
+        vehicle = VehicleFactory()
+        day_start = timezone.now().replace(
+            hour=10, minute=0, second=0, microsecond=0
+        ) - timezone.timedelta(days=2)
+        # Точки на одной параллели, упрощение оставляет только крайние
+        points = [
+            VehicleGPSPointFactory(
+                vehicle=vehicle,
+                point=Point(lng, 55.7),
+                created_at=day_start + timezone.timedelta(minutes=index),
+            )
+            for index, lng in enumerate([37.6, 37.61, 37.62, 37.63, 37.64])
+        ]
+        trip = Trip.objects.create(
+            vehicle=vehicle,
+            start_time=points[1].created_at,
+            end_time=points[3].created_at,
+        )
+        assert trip.point_count == 3
+
+        call_command(
+            "downsample_gps_points",
+            older_than_days=1,
+            window_days=1,
+            tolerance=10,
+            stdout=StringIO(),
+        )
+
+        assert set(VehicleGPSPoint.objects.values_list("id", flat=True)) == {
+            points[index].id for index in (0, 1, 3, 4)
+        }
+        trip.refresh_from_db()
+        assert trip.start_point_id == points[1].id
+        assert trip.end_point_id == points[3].id
+        assert trip.point_count == 2
@@ -0,0 +1,61 @@
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+
+from apps.vehicles.channels import vehicle_status
+from apps.vehicles.channels.vehicle_status import (
+    VehicleStatusConsumer,
+    VehicleStatusTracker,
+)
+
+ONLINE_STATUS = {
+    "vehicle_id": 1,
+    "status": "online",
+    "color": "#22c55e",
+    "text": "В сети",
+    "last_seen": "2024-03-10T10:00:00+00:00",
+    "minutes_ago": 0,
+}
+
+
+def get_communicator():
+    return WebsocketCommunicator(
+        VehicleStatusConsumer.as_asgi(), "/ws/vehicle-status/"
+    )
+
+
+class TestVehicleStatusTracker:
+
+    def test_tracker_is_shared_between_consumers(self, monkeypatch):
+        """Трекер работает, пока не отключится последний клиент"""
+        # Расчет статусов не нужен, проверяется только жизненный цикл
+        monkeypatch.setattr(
+            VehicleStatusTracker, "_calculate_all_statuses", lambda self: {}
+        )
+
+        async def scenario():
+            first = get_communicator()
+            connected, _ = await first.connect()
+            assert connected
+            tracker = vehicle_status._status_tracker
+            assert tracker._subscription is not None
+            tracker.vehicle_statuses.on_next({1: ONLINE_STATUS})
+
+            # Новый клиент сразу получает уже посчитанные статусы
+            second = get_communicator()
+            connected, _ = await second.connect()
+            assert connected
+            assert vehicle_status._status_tracker is tracker
+            assert await second.receive_json_from() == {
+                "type": "initial_statuses",
+                "statuses": {"1": ONLINE_STATUS},
+            }
+
+            await first.disconnect()
+            assert vehicle_status._status_tracker is tracker
+            assert tracker._subscription is not None
+
+            await second.disconnect()
+            assert vehicle_status._status_tracker is None
+            assert tracker._subscription is None
+
+        async_to_sync(scenario)()
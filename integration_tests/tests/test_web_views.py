@@ -389,7 +389,29 @@ class TestTripMapView:
         response = web_client.post(url, data)
 
         assert response.status_code == 200
-        assert "map_html" in response.context
+        assert response.context["trips"][0]["track_url"] == reverse(
+            "tracking:trip_track", args=[trip.id]
+        )
+
+    def test_trip_track(self, web_client):
+        """Трек поездки в формате polyline и повторный запрос по ETag"""
+        user = User.objects.create_superuser(
+            "admin", "admin@test.com", "testpass123"
+        )
+        web_client.force_login(user)
+
+        trip = TripFactory()
+
+        url = reverse("tracking:trip_track", args=[trip.id])
+        response = web_client.get(url)
+
+        assert response.status_code == 200
+        assert response.json()["trip_id"] == trip.id
+        assert "polyline" in response.json()
+
+        response = web_client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+        assert response.status_code == 304
 
     def test_trip_map_no_trips_selected(self, web_client):
         """Карта без выбранных поездок"""
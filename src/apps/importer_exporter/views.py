@@ -99,6 +99,7 @@ class ImportView(LoginRequiredMixin, PermissionRequiredMixin, View):
                 "start_point": None,
                 "end_point": None,
                 "track_points": [],
+                "track_point_times": [],
             }
 
             start_point = None
@@ -131,6 +132,11 @@ class ImportView(LoginRequiredMixin, PermissionRequiredMixin, View):
                     track["track_points"].append(
                         f"({point.latitude}, {point.longitude})"
                     )
+                    track["track_point_times"].append(
+                        point.time.strftime("%Y-%m-%d %H:%M:%S")
+                        if point.time
+                        else None
+                    )
 
             parsed_gpx.append(track)
         return parsed_gpx
@@ -1,6 +1,10 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 
-from apps.tracking.models import Trip, VehicleGPSPoint
+import pytz
+from django.db.models import Sum
+from django.db.models.functions import Coalesce, Trunc
+
+from apps.tracking.models import Trip, VehicleDailyStats
 from apps.vehicles.models import Driver, Vehicle, VehicleDriver
 
 
@@ -82,80 +86,107 @@ class VehicleMileageReport(BaseReport):
         self.enterprise = enterprise
         self.title = "Отчет по пробегу автомобиля"
 
-    def calculate_trip_mileage(self, trip):
-        # Get GPS points for this trip in order
-        gps_points = list(
-            VehicleGPSPoint.objects.filter(
-                vehicle=trip.vehicle,
-                created_at__gte=trip.start_time,
-                created_at__lte=trip.end_time,
-            ).order_by("created_at")
+    def get_timezone(self):
+        if self.vehicle:
+            return pytz.timezone(self.vehicle.enterprise.timezone)
+        return pytz.timezone(self.enterprise.timezone)
+
+    def truncate_to_period(self, date):
+        """
+        Start of the period containing date, the same as Trunc() returns
+        for rolled-up rows, so both land in the same period key.
+        """
+        if self.period == "week":
+            return date - timedelta(days=date.weekday())
+        if self.period == "month":
+            return date.replace(day=1)
+        if self.period == "year":
+            return date.replace(month=1, day=1)
+        return date
+
+    def get_rolled_up_mileage(self, vehicles, start_date, end_date):
+        """
+        Mileage per vehicle and period for finished days,
+        aggregated from the daily statistics rollup.
+        """
+        return (
+            VehicleDailyStats.objects.filter(
+                vehicle__in=vehicles,
+                date__gte=start_date,
+                date__lte=end_date,
+            )
+            .annotate(period_start=Trunc("date", self.period))
+            .values("vehicle_id", "period_start")
+            .annotate(mileage=Coalesce(Sum("distance_km"), 0.0))
+            .order_by("vehicle_id", "period_start")
         )
 
-        # Combine and sort by created_at
-        all_points = sorted(gps_points, key=lambda p: p.created_at)
-
-        # Calculate total distance
-        total_distance = 0
-
-        for i in range(1, len(all_points)):
-            # Calculate distance between consecutive points
-            point1 = all_points[i - 1].point
-            point2 = all_points[i].point
-
-            # Calculate distance in meters
-            distance = (
-                point1.distance(point2) * 100000
-            )  # Convert to meters (approximate)
-            total_distance += distance
-
-        # Return distance in kilometers
-        return total_distance / 1000
+    def get_live_mileage(self, vehicles, timezone, date):
+        """
+        Mileage per vehicle for a day that is not finished yet,
+        calculated from trips.
+        """
+        start_datetime = timezone.localize(datetime.combine(date, time.min))
+        end_datetime = timezone.localize(
+            datetime.combine(date + timedelta(days=1), time.min)
+        )
+        rows = (
+            Trip.objects.filter(
+                vehicle__in=vehicles,
+                start_time__gte=start_datetime,
+                start_time__lt=end_datetime,
+            )
+            .values("vehicle_id")
+            .annotate(mileage=Coalesce(Sum("distance_km"), 0.0))
+            .order_by("vehicle_id")
+        )
+        period_start = self.truncate_to_period(date)
+        for row in rows:
+            yield {**row, "period_start": period_start}
+
+    def get_mileage_by_period(self, vehicles, timezone):
+        """
+        Past days come from the rollup, only today is computed live.
+        """
+        today = datetime.now(timezone).date()
+        yield from self.get_rolled_up_mileage(
+            vehicles,
+            self.start_date,
+            min(self.end_date, today - timedelta(days=1)),
+        )
+        if self.start_date <= today <= self.end_date:
+            yield from self.get_live_mileage(vehicles, timezone, today)
 
     def generate(self):
         result = {"title": self.title, "data": {}, "totals": {"mileage_km": 0}}
 
         # Get vehicles to report on
-        vehicles = []
         if self.vehicle:
             vehicles = [self.vehicle]
         elif self.enterprise:
-            vehicles = Vehicle.objects.filter(enterprise=self.enterprise)
+            vehicles = list(
+                Vehicle.objects.filter(enterprise=self.enterprise)
+                .select_related("brand")
+                .order_by("id")
+            )
         else:
             return result  # No vehicles selected
 
-        # Generate report data
-        for vehicle in vehicles:
-            # Get all trips for the vehicle in the date range
-            trips = Trip.objects.filter(
-                vehicle=vehicle,
-                start_time__date__gte=self.start_date,
-                end_time__date__lte=self.end_date,
-            ).order_by("start_time")
-
-            vehicle_data = {}
-
-            for trip in trips:
-                # Get period key based on format
-                period_key = self.get_period_key(trip.start_time.date())
-
-                # Format the label for display
-                period_label = self.format_period_label(period_key)
-
-                # Calculate trip mileage from GPS points
-                trip_mileage = self.calculate_trip_mileage(trip)
-
-                # Add to result
-                if period_key not in vehicle_data:
-                    vehicle_data[period_key] = {
-                        "label": period_label,
-                        "value": 0,
-                    }
-
-                vehicle_data[period_key]["value"] += trip_mileage
-                result["totals"]["mileage_km"] += trip_mileage
+        vehicles_data = {vehicle.id: {} for vehicle in vehicles}
+        rows = self.get_mileage_by_period(vehicles, self.get_timezone())
+        for row in rows:
+            period_key = self.get_period_key(row["period_start"])
+            vehicle_data = vehicles_data[row["vehicle_id"]]
+            if period_key not in vehicle_data:
+                vehicle_data[period_key] = {
+                    "label": self.format_period_label(period_key),
+                    "value": 0,
+                }
+            vehicle_data[period_key]["value"] += row["mileage"]
+            result["totals"]["mileage_km"] += row["mileage"]
 
-            # Add vehicle data to result
+        for vehicle in vehicles:
+            vehicle_data = vehicles_data[vehicle.id]
             result["data"][vehicle.car_number] = {
                 "name": f"{vehicle.car_number} ({vehicle.brand})",
                 "periods": vehicle_data,
@@ -5,12 +5,11 @@ from import_export.widgets import ForeignKeyWidget
 
 from apps.accounts.models import Manager
 from apps.tracking.models import Trip, VehicleGPSPoint
-from apps.tracking.services import get_address_from_coordinates
 from apps.vehicles.models import Vehicle
 
 
 class VehicleGPSPointAdmin(admin.ModelAdmin):
-    list_display = ["vehicle", "point", "formated_created_at"]
+    list_display = ["vehicle", "point", "speed", "formated_created_at"]
     ordering = ["-created_at"]
 
     def get_queryset(self, request):
@@ -87,18 +86,10 @@ class TripAdmin(ImportExportModelAdmin, ExportActionMixin):
         return None
 
     def formatted_start_point(self, obj):
-        if not obj.start_point or not obj.start_point.point:
-            return None
-        lat, lng = obj.start_point.point.y, obj.start_point.point.x
-        start_address = get_address_from_coordinates(lat, lng)["address"]
-        return start_address
+        return obj.start_address
 
     def formatted_end_point(self, obj):
-        if not obj.end_point or not obj.end_point.point:
-            return None
-        lat, lng = obj.end_point.point.y, obj.end_point.point.x
-        end_address = get_address_from_coordinates(lat, lng)["address"]
-        return end_address
+        return obj.end_address
 
     formatted_start_time.short_description = "Время начала поездки"
     formatted_end_time.short_description = "Время окончания поездки"
@@ -0,0 +1,180 @@
+import time
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+from django.contrib.gis.geos import Point
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from apps.tracking.models import Trip, VehicleGPSPoint
+from apps.tracking.services import update_trip_track
+from apps.vehicles.models import Vehicle
+
+
+class GPSPointBatchWriter:
+    """Буфер GPS точек, который сбрасывается в БД одним bulk_create"""
+
+    def __init__(
+        self,
+        vehicle_ids,
+        dead_letter,
+        max_batch_size=500,
+        max_batch_interval=1.0,
+    ):
+        # vehicle_ids - контейнер с id существующих автомобилей и методом
+        # discard (множество или VehicleIdCache),
+        # dead_letter(data, reason) - обработчик отклоненных сообщений
+        self.vehicle_ids = vehicle_ids
+        self.dead_letter = dead_letter
+        self.max_batch_size = max_batch_size
+        self.max_batch_interval = max_batch_interval
+        self.buffer = []
+        # Исходные сообщения точек буфера, в том же порядке
+        self.messages = []
+        # Сообщения, офсеты которых еще не закоммичены, включая отклоненные
+        self.pending_messages_count = 0
+        self.last_flush_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def add(self, data):
+        """
+        Добавляет сообщение Kafka в буфер.
+        Битые сообщения и точки неизвестных автомобилей уходят в dead letter.
+        """
+        self.pending_messages_count += 1
+        try:
+            gps_point = VehicleGPSPoint(
+                vehicle_id=int(data["vehicle_id"]),
+                point=Point(
+                    float(data["longitude"]), float(data["latitude"])
+                ),
+                created_at=parse_recorded_at(data.get("timestamp")),
+                speed=parse_speed(data.get("calculated_speed")),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            self.dead_letter(data, f"malformed message: {e}")
+            return False
+        if gps_point.vehicle_id not in self.vehicle_ids:
+            self.dead_letter(data, "vehicle not found")
+            return False
+        self.buffer.append(gps_point)
+        self.messages.append(data)
+        return True
+
+    def is_flush_due(self):
+        if len(self.buffer) >= self.max_batch_size:
+            return True
+        elapsed = time.monotonic() - self.last_flush_at
+        return (
+            self.pending_messages_count > 0
+            and elapsed >= self.max_batch_interval
+        )
+
+    def flush(self):
+        """
+        Записывает буфер одной транзакцией.
+        Ошибки БД пробрасываются наружу, чтобы офсеты Kafka не были
+        закоммичены для несохраненных точек. Исключение - точки автомобилей,
+        удаленных после проверки по кэшу: они уходят в dead letter, а
+        остальные точки записываются повторно.
+        """
+        if self.buffer:
+            try:
+                self.save_buffer()
+            except IntegrityError:
+                # Иначе та же пачка падала бы снова после каждого
+                # перезапуска консьюмера
+                if not self.reject_deleted_vehicles():
+                    raise
+                self.save_buffer()
+        saved_count = len(self.buffer)
+        self.buffer = []
+        self.messages = []
+        self.pending_messages_count = 0
+        self.last_flush_at = time.monotonic()
+        return saved_count
+
+    def save_buffer(self):
+        if not self.buffer:
+            return
+        with transaction.atomic():
+            trips = link_points_to_trips(self.buffer)
+            VehicleGPSPoint.objects.bulk_create(
+                self.buffer, batch_size=self.max_batch_size
+            )
+            # Опоздавшие точки меняют трек уже сохраненной поездки, в том
+            # числе ее начальную или конечную точку
+            for trip in trips:
+                update_trip_track(trip)
+
+    def reject_deleted_vehicles(self):
+        """
+        Отправляет в dead letter точки автомобилей, которых уже нет в БД,
+        и убирает их из буфера и кэша. Возвращает False, если таких нет
+        """
+        existing_ids = set(
+            Vehicle.objects.filter(
+                id__in={gps_point.vehicle_id for gps_point in self.buffer}
+            ).values_list("id", flat=True)
+        )
+        kept_points, kept_messages = [], []
+        deleted_ids = set()
+        for gps_point, data in zip(self.buffer, self.messages):
+            if gps_point.vehicle_id in existing_ids:
+                # id, выданные откаченной вставкой, не переиспользуются
+                gps_point.pk = None
+                kept_points.append(gps_point)
+                kept_messages.append(data)
+                continue
+            deleted_ids.add(gps_point.vehicle_id)
+            self.dead_letter(data, "vehicle not found")
+        for vehicle_id in deleted_ids:
+            self.vehicle_ids.discard(vehicle_id)
+        self.buffer = kept_points
+        self.messages = kept_messages
+        return bool(deleted_ids)
+
+
+def link_points_to_trips(gps_points):
+    """
+    Проставляет точкам поездку, в интервал которой они попали: точки
+    могут прийти после сохранения поездки (догоняющее чтение Kafka,
+    выгрузка с устройства). Поездки ищутся одним запросом на пачку.
+    Возвращает поездки, к которым привязана хотя бы одна точка.
+    """
+    trips = Trip.objects.filter(
+        vehicle_id__in={gps_point.vehicle_id for gps_point in gps_points},
+        start_time__lte=max(gps_point.created_at for gps_point in gps_points),
+        end_time__gte=min(gps_point.created_at for gps_point in gps_points),
+    ).select_related("vehicle__enterprise")
+
+    trips_by_vehicle = {}
+    for trip in trips:
+        trips_by_vehicle.setdefault(trip.vehicle_id, []).append(trip)
+
+    linked_trips = {}
+    for gps_point in gps_points:
+        for trip in trips_by_vehicle.get(gps_point.vehicle_id, ()):
+            if trip.start_time <= gps_point.created_at <= trip.end_time:
+                gps_point.trip = trip
+                linked_trips[trip.pk] = trip
+                break
+    return list(linked_trips.values())
+
+
+def parse_recorded_at(timestamp):
+    """Время фиксации точки из сообщения, время без зоны считается UTC"""
+    if timestamp is None:
+        return timezone.now()
+    recorded_at = datetime.fromisoformat(timestamp)
+    if timezone.is_naive(recorded_at):
+        recorded_at = recorded_at.replace(tzinfo=dt_timezone.utc)
+    return recorded_at
+
+
+def parse_speed(speed):
+    if speed is None:
+        return None
+    return float(speed)
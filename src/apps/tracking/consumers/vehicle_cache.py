@@ -0,0 +1,70 @@
+import time
+
+from django.db.models.signals import post_delete, post_save
+
+from apps.vehicles.models import Vehicle
+
+
+class VehicleIdCache:
+    """
+    Множество id существующих автомобилей в памяти процесса консьюмера.
+    Заполняется при старте и перечитывается по TTL. Изменения, сделанные
+    в этом же процессе, применяются сразу через сигналы модели Vehicle.
+    """
+
+    def __init__(self, ttl=300, miss_refresh_interval=5):
+        self.ttl = ttl
+        # Новый автомобиль мог быть создан в другом процессе, поэтому при
+        # промахе кэш перечитывается, но не чаще этого интервала (сек.)
+        self.miss_refresh_interval = miss_refresh_interval
+        self.vehicle_ids = set()
+        self.loaded_at = None
+
+    def __contains__(self, vehicle_id):
+        if self.is_stale():
+            self.refresh()
+        if vehicle_id in self.vehicle_ids:
+            return True
+        if time.monotonic() - self.loaded_at >= self.miss_refresh_interval:
+            self.refresh()
+        return vehicle_id in self.vehicle_ids
+
+    def __len__(self):
+        return len(self.vehicle_ids)
+
+    def is_stale(self):
+        if self.loaded_at is None:
+            return True
+        return time.monotonic() - self.loaded_at >= self.ttl
+
+    def discard(self, vehicle_id):
+        """
+        Убирает автомобиль, удаленный в другом процессе, и помечает кэш
+        устаревшим: при следующей проверке он перечитывается целиком
+        """
+        self.vehicle_ids.discard(vehicle_id)
+        self.loaded_at = None
+
+    def refresh(self):
+        self.vehicle_ids = set(Vehicle.objects.values_list("id", flat=True))
+        self.loaded_at = time.monotonic()
+
+    def connect_signals(self):
+        post_save.connect(
+            self.on_vehicle_saved,
+            sender=Vehicle,
+            weak=False,
+            dispatch_uid=f"vehicle_id_cache_save_{id(self)}",
+        )
+        post_delete.connect(
+            self.on_vehicle_deleted,
+            sender=Vehicle,
+            weak=False,
+            dispatch_uid=f"vehicle_id_cache_delete_{id(self)}",
+        )
+
+    def on_vehicle_saved(self, sender, instance, **kwargs):
+        self.vehicle_ids.add(instance.id)
+
+    def on_vehicle_deleted(self, sender, instance, **kwargs):
+        self.vehicle_ids.discard(instance.id)
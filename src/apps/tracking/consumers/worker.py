@@ -0,0 +1,168 @@
+import json
+import os
+import signal
+import time
+
+from django.conf import settings
+from kafka import ConsumerRebalanceListener, KafkaConsumer, KafkaProducer
+from kafka.errors import NoBrokersAvailable
+
+from apps.tracking import partitions
+from apps.tracking.consumers.batching import GPSPointBatchWriter
+from apps.tracking.consumers.vehicle_cache import VehicleIdCache
+
+
+def create_consumer_with_retry(
+    topic, servers, group_id, max_retries=10, delay=5
+):
+    for attempt in range(max_retries):
+        try:
+            consumer = KafkaConsumer(
+                bootstrap_servers=servers,
+                group_id=group_id,
+                # Офсеты коммитятся вручную только после записи пачки в БД
+                enable_auto_commit=False,
+                value_deserializer=lambda x: json.loads(x.decode("utf-8")),
+            )
+            print(f"Connected to Kafka on attempt {attempt + 1}")
+            return consumer
+        except NoBrokersAvailable as e:
+            print(f"Attempt {attempt + 1} failed: {e}")
+            if attempt < max_retries - 1:
+                time.sleep(delay)
+            else:
+                raise Exception(
+                    f"Failed to connect after {max_retries} attempts"
+                )
+
+
+class DeadLetterPublisher:
+    """Отправляет отклоненные GPS сообщения в отдельный топик Kafka"""
+
+    def __init__(self, topic, servers):
+        self.topic = topic
+        self.producer = KafkaProducer(
+            bootstrap_servers=servers,
+            value_serializer=lambda x: json.dumps(x).encode("utf-8"),
+        )
+
+    def __call__(self, data, reason):
+        self.producer.send(self.topic, {"reason": reason, "message": data})
+
+    def flush(self):
+        self.producer.flush()
+
+    def close(self):
+        self.producer.close()
+
+
+class FlushOnRevokeListener(ConsumerRebalanceListener):
+    """
+    Перед тем как партиции уйдут другому воркеру группы, буфер
+    записывается в БД, а офсеты коммитятся, чтобы не было дублей.
+    """
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    def on_partitions_revoked(self, revoked):
+        if revoked:
+            self.worker.flush()
+
+    def on_partitions_assigned(self, assigned):
+        partitions = sorted(partition.partition for partition in assigned)
+        print(f"[{self.worker.name}] Assigned partitions: {partitions}")
+
+
+class GPSConsumerWorker:
+    """Цикл чтения топика GPS точек с пакетной записью в БД"""
+
+    def __init__(self, name=None):
+        self.name = name or f"gps-consumer-{os.getpid()}"
+        self.running = False
+        self.consumer = None
+        self.dead_letter = None
+        self.writer = None
+        self.partitions_checked_at = None
+
+    def ensure_partitions(self):
+        # Секции на ближайшие месяцы, чтобы точки не копились в секции
+        # по умолчанию, даже если gps_point_partitions не запускали.
+        # Проверка повторяется в цикле: воркер может работать месяцами
+        created = partitions.ensure_partitions()
+        if created:
+            print(f"[{self.name}] Created partitions: {', '.join(created)}")
+        self.partitions_checked_at = time.monotonic()
+
+    def is_partitions_check_due(self):
+        elapsed = time.monotonic() - self.partitions_checked_at
+        return elapsed >= settings.GPS_PARTITIONS_CHECK_INTERVAL
+
+    def setup(self):
+        self.ensure_partitions()
+        self.consumer = create_consumer_with_retry(
+            settings.GPS_POINTS_TOPIC,
+            settings.KAFKA_BOOTSTRAP_SERVERS,
+            settings.GPS_CONSUMER_GROUP_ID,
+        )
+        self.consumer.subscribe(
+            [settings.GPS_POINTS_TOPIC],
+            listener=FlushOnRevokeListener(self),
+        )
+        self.dead_letter = DeadLetterPublisher(
+            settings.GPS_POINTS_DEAD_LETTER_TOPIC,
+            settings.KAFKA_BOOTSTRAP_SERVERS,
+        )
+        vehicle_ids = VehicleIdCache(
+            ttl=settings.GPS_CONSUMER_VEHICLE_CACHE_TTL
+        )
+        vehicle_ids.refresh()
+        vehicle_ids.connect_signals()
+        print(f"[{self.name}] Loaded {len(vehicle_ids)} vehicle ids")
+
+        self.writer = GPSPointBatchWriter(
+            vehicle_ids,
+            self.dead_letter,
+            max_batch_size=settings.GPS_CONSUMER_BATCH_SIZE,
+            max_batch_interval=settings.GPS_CONSUMER_BATCH_INTERVAL,
+        )
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def stop(self, *args):
+        self.running = False
+
+    def flush(self):
+        # Все полученные сообщения уже в буфере, поэтому после записи
+        # можно коммитить текущие позиции консьюмера
+        saved_count = self.writer.flush()
+        self.dead_letter.flush()
+        self.consumer.commit()
+        if saved_count:
+            print(f"[{self.name}] Saved {saved_count} GPS points")
+
+    def run(self):
+        self.setup()
+        self.running = True
+        poll_timeout_ms = int(self.writer.max_batch_interval * 1000)
+        try:
+            while self.running:
+                records = self.consumer.poll(
+                    timeout_ms=poll_timeout_ms,
+                    max_records=self.writer.max_batch_size,
+                )
+                for messages in records.values():
+                    for message in messages:
+                        self.writer.add(message.value)
+
+                if self.writer.is_flush_due():
+                    self.flush()
+                if self.is_partitions_check_due():
+                    self.ensure_partitions()
+            self.flush()
+        finally:
+            self.consumer.close(autocommit=False)
+            self.dead_letter.close()
+            print(f"[{self.name}] Stopped")
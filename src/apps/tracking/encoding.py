@@ -0,0 +1,131 @@
+"""
+Компактные форматы трека: Google encoded polyline с закодированными
+разностями времени и бинарный формат из записей фиксированной длины.
+"""
+
+import struct
+from itertools import groupby
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+POLYLINE_PRECISION = 5
+
+# Заголовок: сигнатура, версия формата, количество точек.
+# Запись точки: время (мс от эпохи, UTC), широта и долгота (градусы * 1e7),
+# id поездки (0, если точка не привязана к поездке). Little-endian
+BINARY_TRACK_MAGIC = b"GTRK"
+BINARY_TRACK_VERSION = 1
+BINARY_TRACK_HEADER = struct.Struct("<4sHI")
+BINARY_TRACK_RECORD = struct.Struct("<qiiI")
+BINARY_COORDINATE_FACTOR = 10**7
+
+COMPACT_OUTPUT_FORMATS = ("polyline", "binary")
+
+
+def encode_signed_values(values):
+    """Кодирует целые числа алгоритмом Google encoded polyline"""
+    chunks = []
+    for value in values:
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+
+def encode_polyline(coordinates, precision=POLYLINE_PRECISION):
+    """coordinates - последовательность (lat, lng)"""
+    factor = 10**precision
+    deltas = []
+    previous_lat = previous_lng = 0
+    for lat, lng in coordinates:
+        lat = round(lat * factor)
+        lng = round(lng * factor)
+        deltas.append(lat - previous_lat)
+        deltas.append(lng - previous_lng)
+        previous_lat, previous_lng = lat, lng
+    return encode_signed_values(deltas)
+
+
+def encode_time_deltas(timestamps):
+    """
+    Разности соседних меток времени в секундах. Первая разность - 0,
+    абсолютное время первой точки передается отдельно.
+    """
+    deltas = []
+    previous = None
+    for timestamp in timestamps:
+        timestamp = round(timestamp)
+        deltas.append(0 if previous is None else timestamp - previous)
+        previous = timestamp
+    return encode_signed_values(deltas)
+
+
+def encode_polyline_track(rows):
+    """rows - (point, created_at, trip_id), упорядоченные по времени"""
+    coordinates = []
+    timestamps = []
+    for point, created_at, _ in rows:
+        coordinates.append((point.y, point.x))
+        timestamps.append(created_at.timestamp())
+    return {
+        "polyline": encode_polyline(coordinates),
+        "timestamps": encode_time_deltas(timestamps),
+        "start_timestamp": round(timestamps[0]) if timestamps else None,
+        "point_count": len(coordinates),
+        "precision": POLYLINE_PRECISION,
+    }
+
+
+def encode_polyline_tracks_by_trip(rows):
+    """Отдельная линия на каждую поездку, поездки не пересекаются по времени"""
+    tracks = []
+    for trip_id, trip_rows in groupby(rows, key=lambda row: row[2]):
+        tracks.append({"trip_id": trip_id, **encode_polyline_track(trip_rows)})
+    return tracks
+
+
+def pack_binary_track(rows, count):
+    buffer = bytearray(
+        BINARY_TRACK_HEADER.size + BINARY_TRACK_RECORD.size * count
+    )
+    BINARY_TRACK_HEADER.pack_into(
+        buffer, 0, BINARY_TRACK_MAGIC, BINARY_TRACK_VERSION, count
+    )
+    offset = BINARY_TRACK_HEADER.size
+    for point, created_at, trip_id in rows:
+        BINARY_TRACK_RECORD.pack_into(
+            buffer,
+            offset,
+            round(created_at.timestamp() * 1000),
+            round(point.y * BINARY_COORDINATE_FACTOR),
+            round(point.x * BINARY_COORDINATE_FACTOR),
+            trip_id or 0,
+        )
+        offset += BINARY_TRACK_RECORD.size
+    return bytes(buffer)
+
+
+def get_track_rows(queryset):
+    return (
+        queryset.order_by("created_at")
+        .values_list("point", "created_at", "trip_id")
+        .iterator(chunk_size=settings.GPS_POINTS_STREAM_CHUNK_SIZE)
+    )
+
+
+def compact_track_response(queryset, output_format, group_by_trip=False):
+    if output_format == "binary":
+        rows = list(get_track_rows(queryset))
+        return HttpResponse(
+            pack_binary_track(rows, len(rows)),
+            content_type="application/octet-stream",
+        )
+
+    rows = get_track_rows(queryset)
+    if group_by_trip:
+        return Response(encode_polyline_tracks_by_trip(rows))
+    return Response(encode_polyline_track(rows))
@@ -0,0 +1,340 @@
+"""
+Обратное геокодирование адресов поездок. Адреса определяются фоновой
+командой geocode_trips и хранятся в поездке, поэтому запросы к API и
+страницы их только читают. Провайдер задается настройкой
+GEOCODING_PROVIDER, ответы провайдера сохраняются в GeocodedLocation.
+"""
+
+import functools
+import threading
+import time
+from datetime import timedelta
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from prometheus_client import Counter
+from requests.adapters import HTTPAdapter
+
+from apps.tracking.geometry import geohash_encode
+from apps.tracking.models import GeocodedLocation, Trip
+
+GEOCODE_CACHE_HITS = Counter(
+    "geocode_cache_hits_total",
+    "Coordinates resolved from the geocoded locations table",
+)
+GEOCODE_CACHE_MISSES = Counter(
+    "geocode_cache_misses_total",
+    "Geohash cells requested from the geocoding provider",
+)
+
+
+class GeocodingError(Exception):
+    """Провайдер недоступен или вернул ошибку, запрос стоит повторить"""
+
+
+class GeocodingProvider:
+
+    def reverse(self, lat, lng):
+        """Адрес точки или None, если провайдер адреса не знает"""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def reverse_many(self, coordinates):
+        """
+        Адреса для набора (lat, lng). Координаты, для которых провайдер
+        вернул ошибку, в результат не попадают. Провайдеры с пакетным API
+        могут переопределить метод.
+        """
+        addresses = {}
+        for lat, lng in coordinates:
+            try:
+                addresses[(lat, lng)] = self.reverse(lat, lng)
+            except GeocodingError:
+                continue
+        return addresses
+
+
+class GeoapifyProvider(GeocodingProvider):
+    url = "https://api.geoapify.com/v1/geocode/reverse"
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key or settings.GEOPIFY_API_KEY
+        # Одна сессия на процесс держит открытые соединения к API
+        self.session = requests.Session()
+        self.session.mount(
+            "https://",
+            HTTPAdapter(pool_maxsize=settings.GEOCODING_POOL_SIZE),
+        )
+
+    def reverse(self, lat, lng):
+        try:
+            response = self.session.get(
+                self.url,
+                params={
+                    "lat": lat,
+                    "lon": lng,
+                    "format": "json",
+                    "apiKey": self.api_key,
+                },
+                timeout=(
+                    settings.GEOCODING_CONNECT_TIMEOUT,
+                    settings.GEOCODING_READ_TIMEOUT,
+                ),
+            )
+            response.raise_for_status()
+            results = response.json().get("results")
+        except (requests.RequestException, ValueError) as e:
+            raise GeocodingError(str(e)) from e
+        if not results:
+            return None
+        return results[0]["formatted"]
+
+
+class StubGeocodingProvider(GeocodingProvider):
+    """Провайдер без сети для тестов и локальной разработки"""
+
+    def reverse(self, lat, lng):
+        return f"{lat:.5f}, {lng:.5f}"
+
+
+class FakeGeocodingProvider(StubGeocodingProvider):
+    """
+    Провайдер для тестов: запоминает запрошенные координаты и может
+    имитировать недоступность внешнего сервиса.
+    """
+
+    def __init__(self, is_down=False):
+        self.is_down = is_down
+        self.calls = []
+
+    def reverse(self, lat, lng):
+        self.calls.append((lat, lng))
+        if self.is_down:
+            raise GeocodingError("provider is down")
+        return super().reverse(lat, lng)
+
+
+class CircuitBreaker:
+    """
+    После failure_threshold ошибок подряд запросы к провайдеру не
+    выполняются reset_timeout секунд. Затем пропускается один пробный
+    запрос: успех закрывает цепь, ошибка снова открывает ее.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_count = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            # Пробный запрос, остальные ждут его результата
+            self.opened_at = time.monotonic()
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failure_count = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failure_count += 1
+            if self.failure_count >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class GeocodingClient(GeocodingProvider):
+    """
+    Обертка над провайдером с автоматическим выключателем. reverse не
+    бросает исключений и быстро возвращает UNKNOWN_ADDRESS, пока провайдер
+    недоступен. reverse_many пропускает такие координаты, чтобы фоновый
+    геокодер не сохранил вместо адреса "неизвестно".
+    """
+
+    UNKNOWN_ADDRESS = None
+
+    def __init__(self, provider, circuit_breaker):
+        self.provider = provider
+        self.circuit_breaker = circuit_breaker
+
+    def call_provider(self, lat, lng):
+        if not self.circuit_breaker.allow_request():
+            raise GeocodingError("circuit breaker is open")
+        try:
+            address = self.provider.reverse(lat, lng)
+        except GeocodingError:
+            self.circuit_breaker.record_failure()
+            raise
+        self.circuit_breaker.record_success()
+        return address
+
+    def reverse(self, lat, lng):
+        try:
+            return self.call_provider(lat, lng)
+        except GeocodingError:
+            return self.UNKNOWN_ADDRESS
+
+    async def areverse(self, lat, lng):
+        """Вариант для ASGI: HTTP-запрос выполняется в пуле потоков"""
+        return await sync_to_async(self.reverse, thread_sensitive=False)(
+            lat, lng
+        )
+
+    def reverse_many(self, coordinates):
+        addresses = {}
+        for lat, lng in coordinates:
+            try:
+                addresses[(lat, lng)] = self.call_provider(lat, lng)
+            except GeocodingError:
+                continue
+        return addresses
+
+
+def get_geocoding_provider():
+    return import_string(settings.GEOCODING_PROVIDER)()
+
+
+@functools.cache
+def get_geocoding_client():
+    """Клиент на процесс: сессия и состояние выключателя общие"""
+    return GeocodingClient(
+        get_geocoding_provider(),
+        CircuitBreaker(
+            settings.GEOCODING_CIRCUIT_FAILURE_THRESHOLD,
+            settings.GEOCODING_CIRCUIT_RESET_TIMEOUT,
+        ),
+    )
+
+
+def get_point_coordinates(gps_point):
+    if gps_point is None:
+        return None
+    return (gps_point.point.y, gps_point.point.x)
+
+
+def resolve_addresses(coordinates, provider):
+    """
+    Адреса для набора (lat, lng) через таблицу GeocodedLocation. Провайдер
+    запрашивается только для ячеек, которых еще нет в таблице, по одной
+    точке на ячейку. Координаты, для которых провайдер вернул ошибку, в
+    результат не попадают.
+    """
+    cells = {
+        point: geohash_encode(*point, settings.GEOCODING_GEOHASH_PRECISION)
+        for point in coordinates
+    }
+    known = dict(
+        GeocodedLocation.objects.filter(
+            geohash__in=set(cells.values())
+        ).values_list("geohash", "address")
+    )
+
+    missing = {}
+    for point, cell in cells.items():
+        if cell in known:
+            GEOCODE_CACHE_HITS.inc()
+        else:
+            missing.setdefault(cell, point)
+    GEOCODE_CACHE_MISSES.inc(len(missing))
+
+    if missing:
+        fetched = provider.reverse_many(missing.values())
+        new_locations = [
+            GeocodedLocation(geohash=cell, address=fetched[point])
+            for cell, point in missing.items()
+            if point in fetched
+        ]
+        # Другой процесс мог успеть записать ту же ячейку
+        GeocodedLocation.objects.bulk_create(
+            new_locations, ignore_conflicts=True
+        )
+        known.update(
+            (location.geohash, location.address) for location in new_locations
+        )
+
+    return {
+        point: known[cell] for point, cell in cells.items() if cell in known
+    }
+
+
+def get_geocode_retry_delay(attempts):
+    return timedelta(
+        seconds=min(
+            settings.GEOCODING_RETRY_BASE_DELAY * 2 ** (attempts - 1),
+            settings.GEOCODING_RETRY_MAX_DELAY,
+        )
+    )
+
+
+def geocode_pending_trips(batch_size=100, provider=None):
+    """
+    Определяет адреса для пачки поездок, ожидающих геокодирования.
+    Провайдер вызывается только для мест, которых еще нет в GeocodedLocation.
+    Поездки, для точек которых провайдер вернул ошибку, остаются в очереди
+    и откладываются с растущей задержкой, чтобы не занимать следующие
+    пачки. Возвращает количество обработанных поездок.
+    """
+    provider = provider or get_geocoding_client()
+    now = timezone.now()
+    trips = list(
+        Trip.objects.filter(geocoded_at__isnull=True)
+        .filter(
+            Q(geocode_retry_at__isnull=True) | Q(geocode_retry_at__lte=now)
+        )
+        .select_related("start_point", "end_point")
+        .order_by("id")[:batch_size]
+    )
+    coordinates = {
+        get_point_coordinates(gps_point)
+        for trip in trips
+        for gps_point in (trip.start_point, trip.end_point)
+        if gps_point is not None
+    }
+    addresses = resolve_addresses(coordinates, provider)
+
+    geocoded_trips = []
+    failed_trips = []
+    for trip in trips:
+        start = get_point_coordinates(trip.start_point)
+        end = get_point_coordinates(trip.end_point)
+        if any(
+            point is not None and point not in addresses
+            for point in (start, end)
+        ):
+            trip.geocode_attempts += 1
+            trip.geocode_retry_at = now + get_geocode_retry_delay(
+                trip.geocode_attempts
+            )
+            failed_trips.append(trip)
+            continue
+        trip.start_address = addresses.get(start)
+        trip.end_address = addresses.get(end)
+        trip.geocoded_at = now
+        trip.geocode_attempts = 0
+        trip.geocode_retry_at = None
+        geocoded_trips.append(trip)
+
+    Trip.objects.bulk_update(
+        geocoded_trips,
+        [
+            "start_address",
+            "end_address",
+            "geocoded_at",
+            "geocode_attempts",
+            "geocode_retry_at",
+        ],
+    )
+    Trip.objects.bulk_update(
+        failed_trips, ["geocode_attempts", "geocode_retry_at"]
+    )
+    return len(geocoded_trips)
@@ -0,0 +1,110 @@
+import math
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_KM = 6371.0
+METERS_PER_DEGREE_LAT = 110_540
+METERS_PER_DEGREE_LNG_AT_EQUATOR = 111_320
+
+
+def project_to_meters(coordinates):
+    """
+    Переводит (lng, lat) в плоские координаты в метрах
+    (равнопромежуточная проекция вокруг средней широты трека).
+    Для треков в пределах дня ошибка проекции пренебрежимо мала.
+    """
+    if not coordinates:
+        return []
+    mean_lat = sum(lat for _, lat in coordinates) / len(coordinates)
+    lng_scale = METERS_PER_DEGREE_LNG_AT_EQUATOR * math.cos(
+        math.radians(mean_lat)
+    )
+    return [
+        (lng * lng_scale, lat * METERS_PER_DEGREE_LAT)
+        for lng, lat in coordinates
+    ]
+
+
+def perpendicular_distance(point, line_start, line_end):
+    x, y = point
+    x1, y1 = line_start
+    x2, y2 = line_end
+    dx, dy = x2 - x1, y2 - y1
+    if dx == 0 and dy == 0:
+        return math.hypot(x - x1, y - y1)
+    return abs(dy * x - dx * y + x2 * y1 - y2 * x1) / math.hypot(dx, dy)
+
+
+def simplify_track_indices(coordinates, tolerance_m):
+    """
+    Алгоритм Дугласа-Пекера для трека из (lng, lat).
+    Возвращает отсортированные индексы точек, которые нужно оставить;
+    первая и последняя точки сохраняются всегда.
+    """
+    if len(coordinates) < 3:
+        return list(range(len(coordinates)))
+
+    projected = project_to_meters(coordinates)
+    keep = {0, len(projected) - 1}
+    stack = [(0, len(projected) - 1)]
+    while stack:
+        start, end = stack.pop()
+        max_distance = 0
+        max_index = None
+        for index in range(start + 1, end):
+            distance = perpendicular_distance(
+                projected[index], projected[start], projected[end]
+            )
+            if distance > max_distance:
+                max_distance = distance
+                max_index = index
+        if max_index is not None and max_distance > tolerance_m:
+            keep.add(max_index)
+            stack.append((start, max_index))
+            stack.append((max_index, end))
+    return sorted(keep)
+
+
+def haversine_km(lng1, lat1, lng2, lat2):
+    """Расстояние по большому кругу между двумя точками, км"""
+    lat1_rad, lat2_rad = math.radians(lat1), math.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlng = math.radians(lng2 - lng1)
+    a = (
+        math.sin(dlat / 2) ** 2
+        + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlng / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def track_length_km(coordinates):
+    """Длина трека из упорядоченных (lng, lat), км"""
+    return sum(
+        haversine_km(*coordinates[i - 1], *coordinates[i])
+        for i in range(1, len(coordinates))
+    )
+
+
+def geohash_encode(lat, lng, precision):
+    """Geohash ячейки с точкой. Точность 8 - ячейка около 38 x 19 м"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    is_lng = True
+    while len(chars) < precision:
+        value, value_range = (lng, lng_range) if is_lng else (lat, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        is_lng = not is_lng
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
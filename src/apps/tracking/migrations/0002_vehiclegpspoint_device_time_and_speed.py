@@ -0,0 +1,22 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vehiclegpspoint',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время'),
+        ),
+        migrations.AddField(
+            model_name='vehiclegpspoint',
+            name='speed',
+            field=models.FloatField(blank=True, null=True, verbose_name='Скорость, км/ч'),
+        ),
+    ]
@@ -0,0 +1,157 @@
+import uuid
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+
+from django.db import migrations, models
+
+TABLE_NAME = "tracking_vehiclegpspoint"
+OLD_TABLE_NAME = f"{TABLE_NAME}_unpartitioned"
+SEQUENCE_NAME = f"{TABLE_NAME}_id_seq"
+DEFAULT_PARTITION_NAME = f"{TABLE_NAME}_default"
+MONTHS_AHEAD = 3
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, months):
+    month_index = month.year * 12 + month.month - 1 + months
+    return datetime(
+        month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc
+    )
+
+
+def get_indexes_and_foreign_keys(cursor, table_name):
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes "
+        "WHERE schemaname = current_schema() "
+        "AND tablename = %s AND indexname <> %s",
+        [table_name, f"{table_name}_pkey"],
+    )
+    indexes = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table_name],
+    )
+    foreign_keys = cursor.fetchall()
+    return indexes, foreign_keys
+
+
+def move_data_to_new_table(cursor, indexes, foreign_keys):
+    """Копирует строки, пересоздает последовательность, индексы и FK"""
+    cursor.execute(
+        f"INSERT INTO {TABLE_NAME} SELECT * FROM {OLD_TABLE_NAME}"
+    )
+    cursor.execute(f"DROP TABLE {OLD_TABLE_NAME}")
+    cursor.execute(f"CREATE SEQUENCE {SEQUENCE_NAME}")
+    cursor.execute(
+        f"SELECT setval('{SEQUENCE_NAME}', "
+        f"COALESCE((SELECT MAX(id) FROM {TABLE_NAME}), 0) + 1, false)"
+    )
+    cursor.execute(
+        f"ALTER TABLE {TABLE_NAME} ALTER COLUMN id "
+        f"SET DEFAULT nextval('{SEQUENCE_NAME}')"
+    )
+    cursor.execute(f"ALTER SEQUENCE {SEQUENCE_NAME} OWNED BY {TABLE_NAME}.id")
+    for _, index_definition in indexes:
+        cursor.execute(index_definition)
+    for name, definition in foreign_keys:
+        cursor.execute(
+            f"ALTER TABLE {TABLE_NAME} ADD CONSTRAINT {name} {definition}"
+        )
+
+
+def detach_old_table(cursor):
+    indexes, foreign_keys = get_indexes_and_foreign_keys(cursor, TABLE_NAME)
+    for name, _ in indexes:
+        cursor.execute(f"DROP INDEX {name}")
+    cursor.execute(f"ALTER TABLE {TABLE_NAME} RENAME TO {OLD_TABLE_NAME}")
+    cursor.execute(
+        f"ALTER TABLE {OLD_TABLE_NAME} "
+        f"RENAME CONSTRAINT {TABLE_NAME}_pkey TO {OLD_TABLE_NAME}_pkey"
+    )
+    # Identity столбец не переносится в секционированную таблицу
+    # (PostgreSQL < 17), поэтому id получает обычную последовательность
+    cursor.execute(
+        f"ALTER TABLE {OLD_TABLE_NAME} ALTER COLUMN id DROP IDENTITY IF EXISTS"
+    )
+    return indexes, foreign_keys
+
+
+def partition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        indexes, foreign_keys = detach_old_table(cursor)
+        cursor.execute(
+            f"CREATE TABLE {TABLE_NAME} "
+            f"(LIKE {OLD_TABLE_NAME} INCLUDING DEFAULTS, "
+            "PRIMARY KEY (id, created_at)) "
+            "PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(
+            f"CREATE TABLE {DEFAULT_PARTITION_NAME} "
+            f"PARTITION OF {TABLE_NAME} DEFAULT"
+        )
+
+        cursor.execute(f"SELECT MIN(created_at) FROM {OLD_TABLE_NAME}")
+        first_point_at = cursor.fetchone()[0]
+        now = datetime.now(timezone.utc)
+        month = month_start(first_point_at or now)
+        last_month = add_months(now, MONTHS_AHEAD)
+        while month <= last_month:
+            next_month = add_months(month, 1)
+            cursor.execute(
+                f"CREATE TABLE {TABLE_NAME}_p{month.year}_{month.month:02d} "
+                f"PARTITION OF {TABLE_NAME} FOR VALUES "
+                f"FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+            )
+            month = next_month
+
+        move_data_to_new_table(cursor, indexes, foreign_keys)
+
+
+def unpartition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"ALTER SEQUENCE {SEQUENCE_NAME} OWNED BY NONE")
+        cursor.execute(
+            f"ALTER SEQUENCE {SEQUENCE_NAME} RENAME TO {SEQUENCE_NAME}_old"
+        )
+        indexes, foreign_keys = detach_old_table(cursor)
+        cursor.execute(
+            f"CREATE TABLE {TABLE_NAME} "
+            f"(LIKE {OLD_TABLE_NAME} INCLUDING DEFAULTS, PRIMARY KEY (id))"
+        )
+        move_data_to_new_table(cursor, indexes, foreign_keys)
+        cursor.execute(f"DROP SEQUENCE {SEQUENCE_NAME}_old")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0002_vehiclegpspoint_device_time_and_speed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vehiclegpspoint',
+            name='uuid',
+            field=models.UUIDField(db_index=True, default=uuid.uuid4, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='start_point',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trip_starts', to='tracking.vehiclegpspoint', verbose_name='Начальная точка'),
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='end_point',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trip_ends', to='tracking.vehiclegpspoint', verbose_name='Конечная точка'),
+        ),
+        migrations.RunPython(partition_table, unpartition_table),
+    ]
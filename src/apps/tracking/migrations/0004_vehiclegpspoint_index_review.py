@@ -0,0 +1,47 @@
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BRIN_INDEX_NAME = "tracking_vehiclegpspoint_created_at_brin"
+
+
+def create_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {BRIN_INDEX_NAME} "
+        "ON tracking_vehiclegpspoint USING brin (created_at)"
+    )
+
+
+def drop_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {BRIN_INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0002_create_deafult_brand'),
+        ('tracking', '0003_partition_vehiclegpspoint'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='vehiclegpspoint',
+            name='tracking_ve_point_98c583_idx',
+        ),
+        migrations.AlterField(
+            model_name='vehiclegpspoint',
+            name='vehicle',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='gps_points', to='vehicles.vehicle'),
+        ),
+        migrations.AlterField(
+            model_name='vehiclegpspoint',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+        migrations.RunPython(create_brin_index, drop_brin_index),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0004_vehiclegpspoint_index_review'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='distance_km',
+            field=models.FloatField(blank=True, null=True, verbose_name='Пробег, км'),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='point_count',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Количество точек'),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='max_speed',
+            field=models.FloatField(blank=True, null=True, verbose_name='Максимальная скорость, км/ч'),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='avg_speed',
+            field=models.FloatField(blank=True, null=True, verbose_name='Средняя скорость, км/ч'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0002_create_deafult_brand'),
+        ('tracking', '0005_trip_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('distance_km', models.FloatField(default=0, verbose_name='Пробег, км')),
+                ('trip_count', models.PositiveIntegerField(default=0, verbose_name='Количество поездок')),
+                ('moving_time', models.DurationField(verbose_name='Время в движении')),
+                ('max_speed', models.FloatField(blank=True, null=True, verbose_name='Максимальная скорость, км/ч')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='vehicles.vehicle', verbose_name='Автомобиль')),
+            ],
+            options={
+                'ordering': ['vehicle', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('vehicle', 'date'), name='unique_vehicle_daily_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0006_vehicledailystats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehiclegpspoint',
+            name='trip',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='gps_points', to='tracking.trip', verbose_name='Поездка'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclegpspoint',
+            index=models.Index(fields=['trip', 'created_at'], name='tracking_ve_trip_id_856882_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0007_vehiclegpspoint_trip'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='start_address',
+            field=models.CharField(blank=True, max_length=500, null=True, verbose_name='Адрес начала'),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='end_address',
+            field=models.CharField(blank=True, max_length=500, null=True, verbose_name='Адрес окончания'),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='geocoded_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Время геокодирования'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(condition=models.Q(('geocoded_at__isnull', True)), fields=['id'], name='tracking_trip_geocode_pending'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0009_geocodedlocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='geocode_attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Попыток геокодирования'),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='geocode_retry_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Повторное геокодирование после'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+BRIN_INDEX_NAME = "tracking_vehiclegpspoint_created_at_brin"
+# Точки одного месяца занимают десятки тысяч страниц, при 128 страницах
+# на диапазон выборка за час читает ~300 лишних страниц, при 16 - ~45
+BRIN_PAGES_PER_RANGE = 16
+
+
+def recreate_brin_index(apps, schema_editor, pages_per_range=None):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    storage = ""
+    if pages_per_range is not None:
+        storage = f" WITH (pages_per_range = {pages_per_range})"
+    schema_editor.execute(f"DROP INDEX IF EXISTS {BRIN_INDEX_NAME}")
+    schema_editor.execute(
+        f"CREATE INDEX {BRIN_INDEX_NAME} "
+        f"ON tracking_vehiclegpspoint USING brin (created_at){storage}"
+    )
+
+
+def narrow_brin_ranges(apps, schema_editor):
+    recreate_brin_index(apps, schema_editor, BRIN_PAGES_PER_RANGE)
+
+
+def restore_brin_ranges(apps, schema_editor):
+    recreate_brin_index(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0010_trip_geocode_retry'),
+    ]
+
+    operations = [
+        migrations.RunPython(narrow_brin_ranges, restore_brin_ranges),
+    ]
@@ -3,22 +3,55 @@ import uuid
 from django.contrib.gis.db import models as gis_models
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 
 from apps.vehicles.models import Vehicle
 
 
 class VehicleGPSPoint(models.Model):
+    """
+    В PostgreSQL таблица секционирована по месяцам created_at
+    (см. apps.tracking.partitions), поэтому первичный ключ в БД - (id,
+    created_at), а уникальность uuid и внешние ключи на точку не
+    поддерживаются на уровне БД.
+    """
+
+    # Отдельный индекс по vehicle не нужен: его покрывает (vehicle, created_at)
     vehicle = models.ForeignKey(
-        Vehicle, on_delete=models.CASCADE, related_name="gps_points"
+        Vehicle,
+        on_delete=models.CASCADE,
+        related_name="gps_points",
+        db_index=False,
     )
+    # Для пространственных запросов у PointField есть GiST индекс
     point = gis_models.PointField(verbose_name="Местоположение")
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Время")
-    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    # Время фиксации точки устройством, а не время записи в БД
+    created_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Время"
+    )
+    speed = models.FloatField(
+        null=True, blank=True, verbose_name="Скорость, км/ч"
+    )
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False)
+    # Поездка, в интервал которой попала точка. Проставляется при
+    # сохранении поездки и командой backfill_gps_point_trips.
+    # Индекс покрывает (trip, created_at)
+    trip = models.ForeignKey(
+        "Trip",
+        on_delete=models.SET_NULL,
+        related_name="gps_points",
+        null=True,
+        blank=True,
+        db_index=False,
+        verbose_name="Поездка",
+    )
 
     class Meta:
+        # В PostgreSQL дополнительно есть BRIN индекс по created_at для
+        # выборок по времени без привязки к автомобилю (миграции 0004, 0011)
         indexes = [
             models.Index(fields=["vehicle", "created_at"]),
-            models.Index(fields=["point"]),
+            models.Index(fields=["trip", "created_at"]),
         ]
 
     def __str__(self):
@@ -40,6 +73,7 @@ class Trip(models.Model):
         null=True,
         blank=True,
         on_delete=models.SET_NULL,
+        db_constraint=False,
         verbose_name="Начальная точка",
     )
     end_point = models.ForeignKey(
@@ -48,10 +82,63 @@ class Trip(models.Model):
         null=True,
         blank=True,
         on_delete=models.SET_NULL,
+        db_constraint=False,
         verbose_name="Конечная точка",
     )
+    # Статистика по точкам поездки, считается при сохранении поездки
+    # (apps.tracking.services.calculate_trip_stats). None - еще не посчитана
+    distance_km = models.FloatField(
+        null=True, blank=True, verbose_name="Пробег, км"
+    )
+    point_count = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name="Количество точек"
+    )
+    max_speed = models.FloatField(
+        null=True, blank=True, verbose_name="Максимальная скорость, км/ч"
+    )
+    avg_speed = models.FloatField(
+        null=True, blank=True, verbose_name="Средняя скорость, км/ч"
+    )
+    # Адреса начальной и конечной точек заполняет фоновый геокодер
+    # (команда geocode_trips). geocoded_at None - поездка ждет геокодирования
+    start_address = models.CharField(
+        max_length=500, null=True, blank=True, verbose_name="Адрес начала"
+    )
+    end_address = models.CharField(
+        max_length=500, null=True, blank=True, verbose_name="Адрес окончания"
+    )
+    geocoded_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Время геокодирования"
+    )
+    # Неудачные попытки геокодирования: поездка не выбирается в пачку до
+    # geocode_retry_at, чтобы ошибочные точки не блокировали очередь
+    geocode_attempts = models.PositiveSmallIntegerField(
+        default=0, verbose_name="Попыток геокодирования"
+    )
+    geocode_retry_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Повторное геокодирование после"
+    )
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__original_vehicle_day = self.__get_vehicle_day()
+
+    def __get_vehicle_day(self):
+        # Через __dict__, чтобы не загружать отложенные поля
+        return (
+            self.__dict__.get("vehicle_id"),
+            self.__dict__.get("start_time"),
+        )
+
+    def get_original_vehicle_day(self):
+        """
+        Автомобиль и время начала поездки на момент загрузки из БД или
+        последнего сохранения - по ним находится прежняя суточная
+        статистика, если поездку перенесли
+        """
+        return self.__original_vehicle_day
+
     def clean(self):
         if (
             self.start_time
@@ -65,13 +152,71 @@ class Trip(models.Model):
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
+        self.__original_vehicle_day = self.__get_vehicle_day()
 
     class Meta:
         indexes = [
             models.Index(fields=["vehicle", "start_time", "end_time"]),
             models.Index(fields=["uuid"]),
+            models.Index(
+                fields=["id"],
+                condition=models.Q(geocoded_at__isnull=True),
+                name="tracking_trip_geocode_pending",
+            ),
         ]
         ordering = ["-start_time"]
 
     def __str__(self):
         return f"Поездка {self.vehicle.car_number}: {self.start_time} - {self.end_time}"
+
+
+class VehicleDailyStats(models.Model):
+    """
+    Суточная статистика автомобиля по поездкам. Дата - локальная дата
+    начала поездки в часовом поясе предприятия. Заполняется при сохранении
+    поездок и командой refresh_vehicle_daily_stats.
+    """
+
+    vehicle = models.ForeignKey(
+        Vehicle,
+        on_delete=models.CASCADE,
+        related_name="daily_stats",
+        verbose_name="Автомобиль",
+    )
+    date = models.DateField(verbose_name="Дата")
+    distance_km = models.FloatField(default=0, verbose_name="Пробег, км")
+    trip_count = models.PositiveIntegerField(
+        default=0, verbose_name="Количество поездок"
+    )
+    moving_time = models.DurationField(verbose_name="Время в движении")
+    max_speed = models.FloatField(
+        null=True, blank=True, verbose_name="Максимальная скорость, км/ч"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["vehicle", "date"], name="unique_vehicle_daily_stats"
+            ),
+        ]
+        ordering = ["vehicle", "date"]
+
+    def __str__(self):
+        return f"{self.vehicle.car_number}: {self.date}"
+
+
+class GeocodedLocation(models.Model):
+    """
+    Постоянный кэш обратного геокодирования, общий для всех процессов.
+    Ключ - geohash ячейки, поэтому близкие точки используют одну запись
+    и внешний геокодер вызывается не больше одного раза на ячейку.
+    """
+
+    geohash = models.CharField(max_length=12, unique=True)
+    # None - провайдер не знает адреса для этой ячейки
+    address = models.CharField(max_length=500, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.geohash}: {self.address}"
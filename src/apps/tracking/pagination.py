@@ -0,0 +1,98 @@
+import base64
+import json
+from datetime import datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Постраничная выдача по ключу (ordering_field, id). Курсор хранит ключ
+    последней отданной записи, поэтому следующая страница - это поиск по
+    индексу от этого ключа, а не OFFSET. Включается, только если в запросе
+    есть cursor или page_size, иначе выдача остается целиком.
+    """
+
+    ordering_field = None
+    page_size = 1000
+    max_page_size = 10000
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def is_requested(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def encode_cursor(self, value, pk):
+        data = json.dumps([value.isoformat(), pk]).encode("ascii")
+        return base64.urlsafe_b64encode(data).decode("ascii")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return datetime.fromisoformat(value), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        field = self.ordering_field
+
+        queryset = queryset.order_by(field, "id")
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            # Диапазон по полю времени использует индекс, исключение
+            # отбрасывает уже отданные записи с тем же временем
+            queryset = queryset.filter(**{f"{field}__gte": value}).exclude(
+                **{field: value, "id__lte": pk}
+            )
+
+        page = list(queryset[: page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = (getattr(page[-1], field), page[-1].pk)
+        return page
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(*self.next_position),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+
+class GPSPointCursorPagination(KeysetCursorPagination):
+    ordering_field = "created_at"
+
+
+class TripCursorPagination(KeysetCursorPagination):
+    ordering_field = "start_time"
+    page_size = 100
+    max_page_size = 1000
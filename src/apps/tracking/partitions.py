@@ -0,0 +1,172 @@
+"""
+Помесячное секционирование таблицы GPS точек (PostgreSQL).
+
+Таблица tracking_vehiclegpspoint секционирована по created_at, у каждой
+секции границы [первое число месяца, первое число следующего месяца) в UTC.
+Точки вне созданных секций попадают в секцию по умолчанию.
+На других СУБД функции модуля ничего не делают.
+"""
+
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from apps.tracking.models import Trip, VehicleGPSPoint
+
+TABLE_NAME = VehicleGPSPoint._meta.db_table
+DEFAULT_PARTITION_NAME = f"{TABLE_NAME}_default"
+# Ключ advisory lock, чтобы несколько процессов не создавали секции разом
+PARTITIONS_LOCK_ID = 7_301_001
+
+
+def is_supported():
+    return connection.vendor == "postgresql"
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, months):
+    month_index = month.year * 12 + month.month - 1 + months
+    return datetime(
+        month_index // 12, month_index % 12 + 1, 1, tzinfo=dt_timezone.utc
+    )
+
+
+def partition_name(month):
+    return f"{TABLE_NAME}_p{month.year}_{month.month:02d}"
+
+
+def get_partitions():
+    """Список (имя, начало месяца) помесячных секций, по возрастанию"""
+    if not is_supported():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = %s AND child.relname <> %s
+            ORDER BY child.relname
+            """,
+            [TABLE_NAME, DEFAULT_PARTITION_NAME],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        year, month = name.rsplit("_p", 1)[1].split("_")
+        partitions.append(
+            (name, datetime(int(year), int(month), 1, tzinfo=dt_timezone.utc))
+        )
+    return partitions
+
+
+def create_month_partition(cursor, month):
+    """
+    Создает секцию месяца, если ее нет. Строки этого месяца, уже попавшие
+    в секцию по умолчанию, переносятся в новую секцию.
+    """
+    name = partition_name(month)
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+
+    start, end = month, add_months(month, 1)
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION_NAME} "
+        "WHERE created_at >= %s AND created_at < %s)",
+        [start, end],
+    )
+    has_rows_in_default = cursor.fetchone()[0]
+    if has_rows_in_default:
+        cursor.execute(
+            f"ALTER TABLE {TABLE_NAME} DETACH PARTITION {DEFAULT_PARTITION_NAME}"
+        )
+    cursor.execute(
+        f"CREATE TABLE {name} PARTITION OF {TABLE_NAME} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+    if has_rows_in_default:
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION_NAME} "
+            "WHERE created_at >= %s AND created_at < %s RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved",
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {TABLE_NAME} ATTACH PARTITION "
+            f"{DEFAULT_PARTITION_NAME} DEFAULT"
+        )
+    return True
+
+
+def ensure_partitions(months_ahead=3, now=None):
+    """Создает секции от текущего месяца на months_ahead месяцев вперед"""
+    if not is_supported():
+        return []
+    current_month = month_start(now or datetime.now(dt_timezone.utc))
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [PARTITIONS_LOCK_ID])
+        cursor.execute("SELECT to_regclass(%s)", [DEFAULT_PARTITION_NAME])
+        if cursor.fetchone()[0] is None:
+            # Миграция с секционированием еще не применена
+            return created
+        for offset in range(months_ahead + 1):
+            month = add_months(current_month, offset)
+            if create_month_partition(cursor, month):
+                created.append(partition_name(month))
+    return created
+
+
+def drop_foreign_keys(cursor, table_name):
+    """
+    Удаляет внешние ключи таблицы. Отсоединенная секция сохраняет
+    унаследованные ключи на автомобили и поездки, и они мешали бы удалять
+    эти записи из основной БД.
+    """
+    cursor.execute(
+        "SELECT conname FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table_name],
+    )
+    for (constraint_name,) in cursor.fetchall():
+        cursor.execute(
+            f'ALTER TABLE {table_name} DROP CONSTRAINT "{constraint_name}"'
+        )
+
+
+def detach_partitions_before(month, drop=False):
+    """
+    Отсоединяет (или удаляет) секции месяцев раньше month.
+    Ссылки поездок на точки из этих секций обнуляются, как при SET_NULL.
+    У оставленных таблиц удаляются внешние ключи, это архив.
+    """
+    if not is_supported():
+        return []
+    old_partitions = [
+        name
+        for name, partition_month in get_partitions()
+        if partition_month < month
+    ]
+    trip_table = Trip._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [PARTITIONS_LOCK_ID])
+        for name in old_partitions:
+            for column in ("start_point_id", "end_point_id"):
+                cursor.execute(
+                    f"UPDATE {trip_table} SET {column} = NULL "
+                    f"WHERE {column} IN (SELECT id FROM {name})"
+                )
+            cursor.execute(
+                f"ALTER TABLE {TABLE_NAME} DETACH PARTITION {name}"
+            )
+            if drop:
+                cursor.execute(f"DROP TABLE {name}")
+            else:
+                drop_foreign_keys(cursor, name)
+    return old_partitions
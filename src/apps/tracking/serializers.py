@@ -1,9 +1,10 @@
 import pytz
+from django.conf import settings
 from rest_framework import serializers
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
 
 from apps.tracking.models import Trip, VehicleGPSPoint
-from apps.tracking.services import get_address_from_coordinates
+from apps.vehicles.models import Vehicle
 
 
 class VehicleGPSPointSerializer(serializers.ModelSerializer):
@@ -49,14 +50,88 @@ class GeoJSONVehicleGPSPointSerializer(GeoFeatureModelSerializer):
         return created_at
 
 
+class VehicleGPSPointValuesSerializer:
+    """
+    Быстрый аналог VehicleGPSPointSerializer для больших выборок. Работает
+    со строками values_list без моделей и полей DRF, часовой пояс
+    определяется один раз на запрос. Результат совпадает с
+    VehicleGPSPointSerializer(many=True).data.
+    """
+
+    value_fields = ("vehicle_id", "point", "created_at")
+
+    def __init__(self, timezone):
+        self.timezone = timezone
+
+    @classmethod
+    def for_vehicle(cls, vehicle_id):
+        timezone_name = (
+            Vehicle.objects.filter(id=vehicle_id)
+            .values_list("enterprise__timezone", flat=True)
+            .first()
+        )
+        return cls(pytz.timezone(timezone_name or settings.TIME_ZONE))
+
+    def get_rows(self, queryset):
+        return queryset.values_list(*self.value_fields)
+
+    def get_geometry(self, point):
+        return {"type": "Point", "coordinates": [point.x, point.y]}
+
+    def to_representation(self, row):
+        vehicle_id, point, created_at = row
+        if created_at is not None:
+            created_at = created_at.astimezone(self.timezone)
+        return {
+            "vehicle": vehicle_id,
+            "point": self.get_geometry(point),
+            "created_at": created_at,
+        }
+
+    def serialize_rows(self, rows):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
+
+    def serialize(self, queryset):
+        return self.serialize_rows(self.get_rows(queryset))
+
+    def serialize_objects(self, points):
+        """Для уже загруженных точек, например страницы пагинации"""
+        return self.serialize_rows(
+            (point.vehicle_id, point.point, point.created_at)
+            for point in points
+        )
+
+
+class GeoJSONVehicleGPSPointValuesSerializer(VehicleGPSPointValuesSerializer):
+    """Быстрый аналог GeoJSONVehicleGPSPointSerializer"""
+
+    def to_representation(self, row):
+        vehicle_id, point, created_at = row
+        if created_at is not None:
+            created_at = created_at.astimezone(self.timezone)
+        return {
+            "type": "Feature",
+            "geometry": self.get_geometry(point),
+            "properties": {"vehicle": vehicle_id, "created_at": created_at},
+        }
+
+    def serialize_rows(self, rows):
+        return {
+            "type": "FeatureCollection",
+            "features": super().serialize_rows(rows),
+        }
+
+
 class TripSerializer(serializers.ModelSerializer):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.timezone_cache = None
 
-    start_point = serializers.SerializerMethodField()
-    end_point = serializers.SerializerMethodField()
+    # Адреса берутся из поездки, их заполняет фоновый геокодер
+    start_point = serializers.CharField(source="start_address", read_only=True)
+    end_point = serializers.CharField(source="end_address", read_only=True)
     start_time = serializers.SerializerMethodField()
     end_time = serializers.SerializerMethodField()
 
@@ -69,6 +144,10 @@ class TripSerializer(serializers.ModelSerializer):
             "end_time",
             "start_point",
             "end_point",
+            "distance_km",
+            "point_count",
+            "max_speed",
+            "avg_speed",
         ]
 
     def get_start_time(self, obj):
@@ -88,17 +167,3 @@ class TripSerializer(serializers.ModelSerializer):
             self.timezone_cache = pytz.timezone(obj.vehicle.enterprise.timezone)
         end_time = end_time.astimezone(self.timezone_cache)
         return end_time
-
-    def get_start_point(self, obj):
-        if obj.start_point:
-            lat, lng = obj.start_point.point.y, obj.start_point.point.x
-            start_address = get_address_from_coordinates(lat, lng)["address"]
-            return start_address
-        return None
-
-    def get_end_point(self, obj):
-        if obj.end_point:
-            lat, lng = obj.end_point.point.y, obj.end_point.point.x
-            end_address = get_address_from_coordinates(lat, lng)["address"]
-            return end_address
-        return None
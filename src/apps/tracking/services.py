@@ -1,34 +1,283 @@
-import requests
-from django.core.cache import cache
-
-from core.settings.local import GEOPIFY_API_KEY
-
-
-def get_address_from_coordinates(lat, lng):
-    try:
-        cache_key = f"lat_lang_to_address_{lat}_{lng}"
-        cached_address = cache.get(cache_key)
-        if cached_address is not None:
-            return {"status": "success", "address": cached_address}
-
-        url = f"https://api.geoapify.com/v1/geocode/reverse?lat={lat}&lon={lng}&format=json&apiKey={GEOPIFY_API_KEY}"
-
-        response = requests.get(url)
-        data = response.json()
-
-        # Проверяем статус ответа
-        if (
-            response.status_code == 200
-            and data.get("results")
-            and len(data["results"]) > 0
-        ):
-            received_address = data["results"][0]["formatted"]
-            cache.set(cache_key, received_address, 60 * 60 * 24)
-            return {
-                "status": "success",
-                "address": received_address,
-            }
-        return {"status": "error", "address": None}
-
-    except Exception:
-        return {"status": "error", "address": None}
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+
+import pytz
+from django.db import connection, transaction
+from django.db.models import (
+    Count,
+    DurationField,
+    Exists,
+    F,
+    Max,
+    OuterRef,
+    Q,
+    Sum,
+)
+from django.db.models.functions import Coalesce, TruncDate
+
+from apps.enterprises.models import Enterprise
+from apps.tracking.geometry import track_length_km
+from apps.tracking.models import Trip, VehicleDailyStats, VehicleGPSPoint
+from apps.vehicles.models import Vehicle
+
+
+def get_trip_points(trip):
+    """
+    Точки поездки. Условие по created_at дублирует интервал поездки, чтобы
+    в PostgreSQL читались только нужные партиции.
+    """
+    return VehicleGPSPoint.objects.filter(
+        trip_id=trip.pk,
+        created_at__gte=trip.start_time,
+        created_at__lte=trip.end_time,
+    )
+
+
+def assign_trip_points(trip):
+    """
+    Привязывает к поездке точки автомобиля из ее интервала и отвязывает
+    точки, оказавшиеся вне интервала после изменения поездки.
+    Возвращает количество привязанных точек.
+    """
+    VehicleGPSPoint.objects.filter(trip_id=trip.pk).filter(
+        Q(created_at__lt=trip.start_time) | Q(created_at__gt=trip.end_time)
+    ).update(trip=None)
+    return VehicleGPSPoint.objects.filter(
+        vehicle_id=trip.vehicle_id,
+        created_at__gte=trip.start_time,
+        created_at__lte=trip.end_time,
+    ).update(trip=trip)
+
+
+def get_trips_with_unlinked_points(trips=None):
+    """
+    Поездки, в интервале которых есть точки без ссылки на поездку.
+    Пустой результат значит, что backfill_gps_point_trips уже выполнен.
+    """
+    if trips is None:
+        trips = Trip.objects.all()
+    unlinked_points = VehicleGPSPoint.objects.filter(
+        vehicle_id=OuterRef("vehicle_id"),
+        created_at__gte=OuterRef("start_time"),
+        created_at__lte=OuterRef("end_time"),
+        trip__isnull=True,
+    )
+    return trips.filter(Exists(unlinked_points))
+
+
+def get_track_stats(trip):
+    """
+    Пробег (км), количество точек и максимальная скорость трека поездки.
+    В PostGIS считается одним агрегатом по геодезической длине линии,
+    поэтому из БД приходят только числа.
+    """
+    if connection.vendor != "postgresql":
+        return get_track_stats_in_python(trip)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT
+                COALESCE(
+                    ST_Length(ST_MakeLine(point ORDER BY created_at)::geography),
+                    0
+                ) / 1000,
+                COUNT(*),
+                MAX(speed)
+            FROM {VehicleGPSPoint._meta.db_table}
+            WHERE trip_id = %s AND created_at >= %s AND created_at <= %s
+            """,
+            [trip.pk, trip.start_time, trip.end_time],
+        )
+        distance_km, point_count, max_speed = cursor.fetchone()
+    return {
+        "distance_km": distance_km,
+        "point_count": point_count,
+        "max_speed": max_speed,
+    }
+
+
+def get_track_stats_in_python(trip):
+    points = get_trip_points(trip)
+    aggregates = points.aggregate(
+        point_count=Count("id"), max_speed=Max("speed")
+    )
+    coordinates = [
+        (point.x, point.y)
+        for point in points.order_by("created_at")
+        .values_list("point", flat=True)
+        .iterator()
+    ]
+    return {
+        "distance_km": track_length_km(coordinates),
+        "point_count": aggregates["point_count"],
+        "max_speed": aggregates["max_speed"],
+    }
+
+
+def calculate_trip_stats(trip):
+    stats = get_track_stats(trip)
+
+    duration_hours = (trip.end_time - trip.start_time).total_seconds() / 3600
+    stats["avg_speed"] = None
+    if duration_hours > 0:
+        stats["avg_speed"] = stats["distance_km"] / duration_hours
+    return stats
+
+
+def set_trip_endpoints(trip):
+    """
+    Проставляет поездке первую и последнюю точки трека. Адреса сменившихся
+    точек нужно определить заново, поэтому геокодирование сбрасывается.
+    Поездка не сохраняется, возвращаются имена измененных полей.
+    """
+    trip_points = get_trip_points(trip)
+    start_point = trip_points.order_by("created_at").first()
+    end_point = trip_points.order_by("-created_at").first()
+    point_ids = (
+        start_point.pk if start_point else None,
+        end_point.pk if end_point else None,
+    )
+    if (trip.start_point_id, trip.end_point_id) == point_ids:
+        return []
+
+    trip.start_point = start_point
+    trip.end_point = end_point
+    trip.start_address = None
+    trip.end_address = None
+    trip.geocoded_at = None
+    trip.geocode_attempts = 0
+    trip.geocode_retry_at = None
+    return [
+        "start_point",
+        "end_point",
+        "start_address",
+        "end_address",
+        "geocoded_at",
+        "geocode_attempts",
+        "geocode_retry_at",
+    ]
+
+
+def update_trip_stats(trip):
+    """Пересчитывает статистику поездки и сохраняет ее без сигналов"""
+    stats = calculate_trip_stats(trip)
+    Trip.objects.filter(pk=trip.pk).update(**stats)
+    for field, value in stats.items():
+        setattr(trip, field, value)
+    refresh_trip_daily_stats(trip)
+    return stats
+
+
+def update_trip_track(trip):
+    """
+    Пересчитывает концы трека и статистику поездки после того, как к ней
+    добавились точки, и сохраняет их без сигналов
+    """
+    changed_fields = set_trip_endpoints(trip)
+    if changed_fields:
+        Trip.objects.filter(pk=trip.pk).update(
+            **{field: getattr(trip, field) for field in changed_fields}
+        )
+    return update_trip_stats(trip)
+
+
+def refresh_vehicle_daily_stats(start_date, end_date, vehicle_ids=None):
+    """
+    Пересчитывает суточную статистику за локальные даты
+    [start_date, end_date]. Поездки группируются по дате начала в часовом
+    поясе предприятия, поэтому расчет идет отдельным запросом на каждый
+    часовой пояс. Возвращает количество записанных строк.
+    """
+    timezones = Enterprise.objects.values_list("timezone", flat=True)
+    if vehicle_ids is not None:
+        timezones = timezones.filter(vehicles__id__in=vehicle_ids)
+
+    saved_count = 0
+    for timezone_name in set(timezones):
+        timezone = pytz.timezone(timezone_name)
+        start_datetime = timezone.localize(
+            datetime.combine(start_date, time.min)
+        )
+        end_datetime = timezone.localize(
+            datetime.combine(end_date + timedelta(days=1), time.min)
+        )
+
+        trips = Trip.objects.filter(
+            vehicle__enterprise__timezone=timezone_name,
+            start_time__gte=start_datetime,
+            start_time__lt=end_datetime,
+        )
+        stale_stats = VehicleDailyStats.objects.filter(
+            vehicle__enterprise__timezone=timezone_name,
+            date__gte=start_date,
+            date__lte=end_date,
+        )
+        if vehicle_ids is not None:
+            trips = trips.filter(vehicle_id__in=vehicle_ids)
+            stale_stats = stale_stats.filter(vehicle_id__in=vehicle_ids)
+
+        rows = (
+            trips.annotate(date=TruncDate("start_time", tzinfo=timezone))
+            .values("vehicle_id", "date")
+            .annotate(
+                distance_km=Coalesce(Sum("distance_km"), 0.0),
+                trip_count=Count("id"),
+                moving_time=Sum(
+                    F("end_time") - F("start_time"),
+                    output_field=DurationField(),
+                ),
+                max_speed=Max("max_speed"),
+            )
+            # Один порядок блокировок строк у параллельных пересчетов
+            .order_by("vehicle_id", "date")
+        )
+        daily_stats = [VehicleDailyStats(**row) for row in rows]
+
+        # Строки обновляются на месте: параллельный пересчет того же дня не
+        # нарушит уникальность (vehicle, date), как delete + insert.
+        # Дни, в которых поездок не осталось, должны пропасть из сводки -
+        # это строки, которые не обновил этот пересчет
+        refreshed_at = datetime.now(dt_timezone.utc)
+        with transaction.atomic():
+            VehicleDailyStats.objects.bulk_create(
+                daily_stats,
+                update_conflicts=True,
+                unique_fields=["vehicle", "date"],
+                update_fields=[
+                    "distance_km",
+                    "trip_count",
+                    "moving_time",
+                    "max_speed",
+                    "updated_at",
+                ],
+            )
+            stale_stats.filter(updated_at__lt=refreshed_at).delete()
+        saved_count += len(daily_stats)
+    return saved_count
+
+
+def refresh_vehicle_day_stats(vehicle, moment):
+    """Пересчитывает суточную статистику автомобиля за день момента moment"""
+    timezone = pytz.timezone(vehicle.enterprise.timezone)
+    date = moment.astimezone(timezone).date()
+    refresh_vehicle_daily_stats(date, date, vehicle_ids=[vehicle.pk])
+
+
+def refresh_trip_daily_stats(trip, original_vehicle_day=None):
+    """
+    Пересчитывает суточную статистику за день начала поездки.
+    original_vehicle_day - (vehicle_id, start_time) до изменения поездки:
+    если поездку перенесли на другой день или автомобиль, прежний день
+    тоже пересчитывается, иначе в нем остался бы пробег поездки
+    """
+    refresh_vehicle_day_stats(trip.vehicle, trip.start_time)
+    if original_vehicle_day is None:
+        return
+    vehicle_id, start_time = original_vehicle_day
+    if vehicle_id is None or start_time is None:
+        return
+    if (vehicle_id, start_time) == (trip.vehicle_id, trip.start_time):
+        return
+    vehicle = Vehicle.objects.select_related("enterprise").get(pk=vehicle_id)
+    refresh_vehicle_day_stats(vehicle, start_time)
@@ -1,36 +1,33 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from apps.tracking.models import Trip, VehicleGPSPoint
-from apps.tracking.services import get_address_from_coordinates
+from apps.tracking.models import Trip
+from apps.tracking.services import (
+    assign_trip_points,
+    calculate_trip_stats,
+    refresh_trip_daily_stats,
+    set_trip_endpoints,
+)
 
 
 @receiver(post_save, sender=Trip)
 def update_trip_points(sender, instance, **kwargs):
+    # Состояние до сохранения, пока его не обновил instance.save() ниже
+    original_vehicle_day = instance.get_original_vehicle_day()
 
-    start_point = (
-        VehicleGPSPoint.objects.filter(
-            vehicle=instance.vehicle,
-            created_at__gte=instance.start_time,
-            created_at__lte=instance.end_time,
-        )
-        .order_by("created_at")
-        .first()
-    )
-
-    end_point = (
-        VehicleGPSPoint.objects.filter(
-            vehicle=instance.vehicle,
-            created_at__gte=instance.start_time,
-            created_at__lte=instance.end_time,
-        )
-        .order_by("-created_at")
-        .first()
-    )
+    assign_trip_points(instance)
+    set_trip_endpoints(instance)
 
     # Обновляем запись Trip, отключая сигнал, чтобы избежать рекурсии
     post_save.disconnect(update_trip_points, sender=Trip)
-    instance.start_point = start_point
-    instance.end_point = end_point
+    for field, value in calculate_trip_stats(instance).items():
+        setattr(instance, field, value)
     instance.save()
     post_save.connect(update_trip_points, sender=Trip)
+
+    refresh_trip_daily_stats(instance, original_vehicle_day)
+
+
+@receiver(post_delete, sender=Trip)
+def refresh_deleted_trip_daily_stats(sender, instance, **kwargs):
+    refresh_trip_daily_stats(instance, instance.get_original_vehicle_day())
@@ -0,0 +1,194 @@
+"""
+Упрощение треков поездок для отображения на карте. Упрощенный трек - это
+подмножество исходных точек, поэтому у оставшихся точек сохраняются время
+и остальные поля, и упрощение работает с любым форматом вывода.
+"""
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from rest_framework import serializers as rest_serializers
+
+from apps.tracking.geometry import (
+    METERS_PER_DEGREE_LAT,
+    METERS_PER_DEGREE_LNG_AT_EQUATOR,
+    simplify_track_indices,
+)
+from apps.tracking.models import Trip, VehicleGPSPoint
+from apps.tracking.services import get_trip_points
+
+# Метров на пиксель тайла 256px на экваторе при нулевом масштабе
+METERS_PER_PIXEL_AT_ZOOM_0 = 156_543.034
+MAX_ZOOM = 22
+SIMPLIFIED_TRACK_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def zoom_to_tolerance_m(zoom):
+    """Допуск в один пиксель для масштаба карты"""
+    return METERS_PER_PIXEL_AT_ZOOM_0 / 2**zoom
+
+
+def get_simplify_tolerance(params):
+    """
+    Допуск упрощения в метрах из параметров tolerance (метры) или zoom
+    (масштаб карты). None, если упрощение не запрошено.
+    """
+    tolerance = params.get("tolerance")
+    zoom = params.get("zoom")
+    if tolerance:
+        try:
+            tolerance = float(tolerance)
+        except ValueError:
+            tolerance = None
+        if tolerance is None or tolerance <= 0:
+            raise rest_serializers.ValidationError(
+                "'tolerance' must be a positive number of meters"
+            )
+        return tolerance
+    if zoom:
+        try:
+            zoom = int(zoom)
+        except ValueError:
+            zoom = None
+        if zoom is None or not 0 <= zoom <= MAX_ZOOM:
+            raise rest_serializers.ValidationError(
+                f"'zoom' must be an integer from 0 to {MAX_ZOOM}"
+            )
+        return zoom_to_tolerance_m(zoom)
+    return None
+
+
+def get_simplified_point_ids_sql(trips, tolerance_m):
+    """
+    SQL (PostgreSQL) и параметры выборки id точек упрощенных треков всех
+    поездок trips одним запросом, без передачи id через приложение.
+
+    ST_SimplifyPreserveTopology считается в GEOS и теряет M, поэтому
+    используется ST_Simplify: для одной линии сохранять топологию не
+    нужно, а M с id точки переживает упрощение. preserveCollapsed
+    оставляет концы линии, которая целиком меньше допуска, иначе
+    короткая поездка пропала бы с карты при малом масштабе.
+    Как и в project_to_meters, точки переводятся в метры
+    равнопромежуточной проекцией вокруг средней широты трека: градус
+    долготы на широте Москвы почти вдвое короче, чем на экваторе.
+    Из одной точки линия не строится, такие поездки отдаются как есть.
+    """
+    trips_sql, trips_params = (
+        trips.order_by().values("id").query.sql_with_params()
+    )
+    sql = f"""
+        WITH trip_points AS (
+            SELECT
+                gps.id,
+                gps.trip_id,
+                gps.point,
+                gps.created_at,
+                avg(ST_Y(gps.point)) OVER (
+                    PARTITION BY gps.trip_id
+                ) AS mean_lat
+            FROM {VehicleGPSPoint._meta.db_table} AS gps
+            JOIN {Trip._meta.db_table} AS trip ON trip.id = gps.trip_id
+            WHERE gps.trip_id IN ({trips_sql})
+                AND gps.created_at >= trip.start_time
+                AND gps.created_at <= trip.end_time
+        ),
+        simplified AS (
+            SELECT ST_Simplify(
+                ST_MakeLine(
+                    ST_MakePointM(
+                        ST_X(point) * %s * cos(radians(mean_lat)),
+                        ST_Y(point) * %s,
+                        id
+                    )
+                    ORDER BY created_at
+                ),
+                %s,
+                true
+            ) AS track
+            FROM trip_points
+            GROUP BY trip_id
+            HAVING count(*) > 1
+        )
+        SELECT ST_M((ST_DumpPoints(track)).geom)::bigint FROM simplified
+        UNION ALL
+        SELECT min(id) FROM trip_points
+        GROUP BY trip_id
+        HAVING count(*) = 1
+    """
+    params = [
+        *trips_params,
+        METERS_PER_DEGREE_LNG_AT_EQUATOR,
+        METERS_PER_DEGREE_LAT,
+        tolerance_m,
+    ]
+    return sql, params
+
+
+def filter_simplified_points(points, trips, tolerance_m):
+    """
+    Оставляет в points только точки упрощенных треков поездок trips.
+    В PostgreSQL упрощение становится подзапросом того же запроса.
+    """
+    if connection.vendor != "postgresql":
+        return points.filter(
+            id__in=get_simplified_point_ids(trips, tolerance_m)
+        )
+    return points.filter(
+        id__in=RawSQL(*get_simplified_point_ids_sql(trips, tolerance_m))
+    )
+
+
+def calculate_simplified_point_ids(trip, tolerance_m):
+    if connection.vendor != "postgresql":
+        return calculate_simplified_point_ids_in_python(trip, tolerance_m)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            *get_simplified_point_ids_sql(
+                Trip.objects.filter(pk=trip.pk), tolerance_m
+            )
+        )
+        return [point_id for (point_id,) in cursor.fetchall()]
+
+
+def calculate_simplified_point_ids_in_python(trip, tolerance_m):
+    rows = list(
+        get_trip_points(trip).order_by("created_at").values_list("id", "point")
+    )
+    coordinates = [(point.x, point.y) for _, point in rows]
+    return [
+        rows[index][0]
+        for index in simplify_track_indices(coordinates, tolerance_m)
+    ]
+
+
+def get_simplified_trip_cache_key(trip, tolerance_m):
+    # point_count и end_time пересчитываются при изменении поездки,
+    # поэтому старый результат перестает совпадать по ключу
+    return (
+        f"trip_track_simplified_{trip.pk}_{trip.point_count}_"
+        f"{trip.end_time.timestamp():.0f}_{tolerance_m:.3f}"
+    )
+
+
+def get_simplified_point_ids(trips, tolerance_m):
+    """id точек, оставшихся после упрощения треков поездок"""
+    trips = list(trips)
+    cache_keys = {
+        trip.pk: get_simplified_trip_cache_key(trip, tolerance_m)
+        for trip in trips
+    }
+    cached = cache.get_many(cache_keys.values())
+
+    point_ids = []
+    to_cache = {}
+    for trip in trips:
+        cache_key = cache_keys[trip.pk]
+        trip_point_ids = cached.get(cache_key)
+        if trip_point_ids is None:
+            trip_point_ids = calculate_simplified_point_ids(trip, tolerance_m)
+            to_cache[cache_key] = trip_point_ids
+        point_ids.extend(trip_point_ids)
+    if to_cache:
+        cache.set_many(to_cache, SIMPLIFIED_TRACK_CACHE_TIMEOUT)
+    return point_ids
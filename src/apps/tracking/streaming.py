@@ -0,0 +1,58 @@
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from apps.tracking.serializers import GeoJSONVehicleGPSPointValuesSerializer
+
+
+def is_stream_requested(request):
+    return request.query_params.get("stream", "").lower() in ("1", "true")
+
+
+def dumps(data):
+    # Те же параметры, что у JSONRenderer, чтобы вывод совпадал с Response
+    return json.dumps(
+        data, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":")
+    )
+
+
+def iter_json_items(queryset, serializer, chunk_size):
+    """
+    Сериализует строки точек и отдает их пачками по chunk_size,
+    разделенными запятыми. В памяти одновременно находится не больше одной
+    пачки.
+    """
+    items = []
+    is_first_chunk = True
+    rows = serializer.get_rows(queryset).iterator(chunk_size=chunk_size)
+    for row in rows:
+        items.append(dumps(serializer.to_representation(row)))
+        if len(items) >= chunk_size:
+            yield ("" if is_first_chunk else ",") + ",".join(items)
+            is_first_chunk = False
+            items = []
+    if items:
+        yield ("" if is_first_chunk else ",") + ",".join(items)
+
+
+def stream_gps_points(queryset, serializer, chunk_size=None):
+    chunk_size = chunk_size or settings.GPS_POINTS_STREAM_CHUNK_SIZE
+    if isinstance(serializer, GeoJSONVehicleGPSPointValuesSerializer):
+        yield '{"type":"FeatureCollection","features":['
+        yield from iter_json_items(queryset, serializer, chunk_size)
+        yield "]}"
+        return
+
+    yield "["
+    yield from iter_json_items(queryset, serializer, chunk_size)
+    yield "]"
+
+
+def gps_points_streaming_response(queryset, serializer):
+    """Ответ с точками в том же формате, что и у Response, но потоком"""
+    return StreamingHttpResponse(
+        stream_gps_points(queryset, serializer),
+        content_type="application/json",
+    )
@@ -0,0 +1,204 @@
+"""
+Векторные тайлы (Mapbox Vector Tile) с GPS точками автомобилей. Тайл
+собирает PostGIS (ST_AsMVT), точки агрегируются по сетке внутри тайла,
+поэтому размер тайла не зависит от количества точек за период.
+"""
+
+import hashlib
+from datetime import datetime, time, timedelta
+
+import pytz
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import serializers as rest_serializers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from apps.enterprises.models import Enterprise
+from apps.tracking.models import VehicleGPSPoint
+from apps.tracking.simplification import MAX_ZOOM
+from apps.vehicles.models import Vehicle
+
+MVT_CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
+MVT_LAYER_NAME = "gps_points"
+# Размер тайла в собственных координатах MVT и запас по краям, чтобы
+# точки на границе соседних тайлов не обрезались
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+# Размер ячейки сетки, по которой агрегируются точки, в координатах MVT:
+# не больше (4096 / 16) ** 2 объектов на тайл
+MVT_GRID_CELL = 16
+
+
+class TilesNotSupported(APIException):
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = "Vector tiles are available only on PostgreSQL"
+
+
+def is_supported():
+    return connection.vendor == "postgresql"
+
+
+def validate_tile(z, x, y):
+    if z > MAX_ZOOM:
+        raise rest_serializers.ValidationError(
+            f"'z' must be an integer from 0 to {MAX_ZOOM}"
+        )
+    if x >= 2**z or y >= 2**z:
+        raise rest_serializers.ValidationError(
+            f"'x' and 'y' must be less than {2**z} for zoom {z}"
+        )
+
+
+def get_tile_dates(params):
+    """Локальные даты start_date и end_date (включительно) из параметров"""
+    start_date = params.get("start_date")
+    end_date = params.get("end_date")
+    if start_date is None or end_date is None:
+        raise rest_serializers.ValidationError(
+            "'start_date' and 'end_date' parameters are required"
+        )
+    start_date = parse_date(start_date)
+    end_date = parse_date(end_date)
+    if start_date is None or end_date is None:
+        raise rest_serializers.ValidationError(
+            "'start_date' and 'end_date' must be dates (YYYY-MM-DD)"
+        )
+    if start_date > end_date:
+        raise rest_serializers.ValidationError(
+            "'start_date' cant be greater than 'end_date'"
+        )
+    if (end_date - start_date).days >= settings.GPS_TILES_MAX_PERIOD_DAYS:
+        raise rest_serializers.ValidationError(
+            f"Period must be shorter than "
+            f"{settings.GPS_TILES_MAX_PERIOD_DAYS} days"
+        )
+    return start_date, end_date
+
+
+def get_tile_periods(start_date, end_date, enterprise_ids):
+    """
+    Интервалы [начало start_date, начало дня после end_date) по часовым
+    поясам предприятий enterprise_ids (None - всех предприятий): сутки
+    каждого предприятия считаются в его часовом поясе. Границы по
+    created_at, а не по дате, чтобы PostgreSQL читал только нужные
+    партиции.
+    """
+    timezones = Enterprise.objects.values_list("timezone", flat=True)
+    if enterprise_ids is not None:
+        timezones = timezones.filter(id__in=enterprise_ids)
+
+    periods = {}
+    for timezone_name in set(timezones):
+        enterprise_timezone = pytz.timezone(timezone_name)
+        periods[timezone_name] = (
+            enterprise_timezone.localize(
+                datetime.combine(start_date, time.min)
+            ),
+            enterprise_timezone.localize(
+                datetime.combine(end_date + timedelta(days=1), time.min)
+            ),
+        )
+    return periods
+
+
+def get_tile_cache_key(z, x, y, periods, enterprise_ids):
+    if enterprise_ids is None:
+        scope = "all"
+    else:
+        scope = hashlib.md5(
+            ",".join(map(str, sorted(enterprise_ids))).encode()
+        ).hexdigest()
+    period = hashlib.md5(
+        ",".join(
+            f"{timezone_name}:{start.timestamp():.0f}:{end.timestamp():.0f}"
+            for timezone_name, (start, end) in sorted(periods.items())
+        ).encode()
+    ).hexdigest()
+    return f"gps_tile_{z}_{x}_{y}_{period}_{scope}"
+
+
+def get_tile_cache_timeout(periods):
+    # В открытый период еще приходят точки, закрытый почти не меняется
+    now = timezone.now()
+    if any(end > now for _, end in periods.values()):
+        return settings.GPS_TILES_LIVE_CACHE_TIMEOUT
+    return settings.GPS_TILES_CACHE_TIMEOUT
+
+
+def render_tile(z, x, y, periods, enterprise_ids):
+    """
+    Тайл с точками за периоды periods из get_tile_periods. enterprise_ids -
+    предприятия, точки автомобилей которых попадают в тайл, None - все
+    предприятия.
+    """
+    params = [MVT_LAYER_NAME, MVT_EXTENT]
+    params += [z, x, y, MVT_EXTENT, MVT_BUFFER, MVT_GRID_CELL]
+    params += [z, x, y, MVT_BUFFER / MVT_EXTENT]
+    period_filters = []
+    for timezone_name, (start, end) in sorted(periods.items()):
+        period_filters.append(
+            "(enterprise.timezone = %s"
+            " AND point.created_at >= %s AND point.created_at < %s)"
+        )
+        params += [timezone_name, start, end]
+    enterprise_filter = ""
+    if enterprise_ids is not None:
+        enterprise_filter = "AND vehicle.enterprise_id = ANY(%s)"
+        params.append(list(enterprise_ids))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT COALESCE(ST_AsMVT(cells, %s, %s, 'geom'), ''::bytea)
+            FROM (
+                SELECT geom,
+                       COUNT(*) AS point_count,
+                       COUNT(DISTINCT vehicle_id) AS vehicle_count
+                FROM (
+                    SELECT point.vehicle_id,
+                           ST_SnapToGrid(
+                               ST_AsMVTGeom(
+                                   ST_Transform(point.point, 3857),
+                                   ST_TileEnvelope(%s, %s, %s),
+                                   %s,
+                                   %s
+                               ),
+                               %s
+                           ) AS geom
+                    FROM {VehicleGPSPoint._meta.db_table} AS point
+                    JOIN {Vehicle._meta.db_table} AS vehicle
+                        ON vehicle.id = point.vehicle_id
+                    JOIN {Enterprise._meta.db_table} AS enterprise
+                        ON enterprise.id = vehicle.enterprise_id
+                    WHERE point.point && ST_Transform(
+                            ST_TileEnvelope(%s, %s, %s, margin => %s), 4326
+                        )
+                        AND ({" OR ".join(period_filters)})
+                        {enterprise_filter}
+                ) AS points
+                WHERE geom IS NOT NULL
+                GROUP BY geom
+            ) AS cells
+            """,
+            params,
+        )
+        return bytes(cursor.fetchone()[0])
+
+
+def get_tile(z, x, y, periods, enterprise_ids):
+    """Тайл из кэша или из БД"""
+    if not is_supported():
+        raise TilesNotSupported()
+    # Нет предприятий - нет и точек
+    if not periods:
+        return b""
+    cache_key = get_tile_cache_key(z, x, y, periods, enterprise_ids)
+    tile = cache.get(cache_key)
+    if tile is None:
+        tile = render_tile(z, x, y, periods, enterprise_ids)
+        cache.set(cache_key, tile, get_tile_cache_timeout(periods))
+    return tile
@@ -1,8 +1,10 @@
+from django.urls import path
 from rest_framework import routers
 
 from apps.tracking.views import (
     TripGPSPointViewSet,
     TripListViewSet,
+    VehicleGPSPointTileView,
     VehicleGPSPointViewSet,
 )
 
@@ -17,4 +19,9 @@ router.register(r"trips", TripListViewSet, basename="trips")
 
 urlpatterns = [
     *router.urls,
+    path(
+        "tiles/<int:z>/<int:x>/<int:y>.mvt",
+        VehicleGPSPointTileView.as_view(),
+        name="gps_point_tiles",
+    ),
 ]
@@ -1,6 +1,11 @@
 from django.urls import path
 
-from apps.tracking.views import ExportTrips, ImportTripView, TripMapView
+from apps.tracking.views import (
+    ExportTrips,
+    ImportTripView,
+    TripMapView,
+    TripTrackView,
+)
 
 app_name = "tracking"
 urlpatterns = [
@@ -14,6 +19,11 @@ urlpatterns = [
         TripMapView.as_view(),
         name="trips_map",
     ),
+    path(
+        "<int:trip_id>/track/",
+        TripTrackView.as_view(),
+        name="trip_track",
+    ),
     path(
         "import/<int:vehicle_id>/",
         ImportTripView.as_view(),
@@ -2,13 +2,20 @@ import colorsys
 import uuid
 from datetime import datetime
 
-import folium
 import pytz
 from django.contrib import messages
 from django.contrib.gis.geos import Point
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotModified,
+    JsonResponse,
+)
 from django.shortcuts import HttpResponseRedirect, get_object_or_404, render
 from django.urls import reverse, reverse_lazy
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag
 from django.views.generic import View
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -18,21 +25,52 @@ from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from apps.accounts.models import Manager
 from apps.importer_exporter.views import ImportView
 from apps.tracking.admin import TripResource
 from apps.tracking.mixins import WebTripMixin
+from apps.tracking.encoding import (
+    COMPACT_OUTPUT_FORMATS,
+    compact_track_response,
+    encode_polyline_track,
+    get_track_rows,
+)
 from apps.tracking.models import Trip, VehicleGPSPoint
+from apps.tracking.pagination import (
+    GPSPointCursorPagination,
+    TripCursorPagination,
+)
 from apps.tracking.serializers import (
-    GeoJSONVehicleGPSPointSerializer,
+    GeoJSONVehicleGPSPointValuesSerializer,
     TripSerializer,
-    VehicleGPSPointSerializer,
+    VehicleGPSPointValuesSerializer,
+)
+from apps.tracking.services import get_trip_points, update_trip_stats
+from apps.tracking.simplification import (
+    filter_simplified_points,
+    get_simplify_tolerance,
+)
+from apps.tracking.streaming import (
+    gps_points_streaming_response,
+    is_stream_requested,
+)
+from apps.tracking.tiles import (
+    MVT_CONTENT_TYPE,
+    get_tile,
+    get_tile_cache_timeout,
+    get_tile_dates,
+    get_tile_periods,
+    validate_tile,
 )
 from apps.vehicles.models import Vehicle
 from core.permissions import HasRoleOrSuper
 from core.utils.time import str_iso_datetime_to_timezone
 
+TRIP_TRACK_FORMATS = ("polyline", "geojson")
+TRIP_TRACK_CACHE_TIMEOUT = 60 * 60
+
 
 class ExportTrips(WebTripMixin, View):
     model = Trip
@@ -70,6 +108,12 @@ class ExportTrips(WebTripMixin, View):
         return queryset
 
 
+def get_gps_point_serializer(output_format, vehicle_id):
+    if output_format == "geojson":
+        return GeoJSONVehicleGPSPointValuesSerializer.for_vehicle(vehicle_id)
+    return VehicleGPSPointValuesSerializer.for_vehicle(vehicle_id)
+
+
 class TripMapView(WebTripMixin, View):
     http_method_names = ["post"]
     permission_required = ["tracking.view_trip"]
@@ -102,74 +146,122 @@ class TripMapView(WebTripMixin, View):
             return HttpResponseRedirect(request.META.get("HTTP_REFERER", "/"))
 
         selected_trip_ids = [int(trip_id) for trip_id in selected_trip_ids]
-        selected_trips = Trip.objects.filter(id__in=selected_trip_ids)
-        colors = self.get_distinct_colors_hex(len(selected_trips))
+        selected_trips = list(
+            Trip.objects.filter(id__in=selected_trip_ids).select_related(
+                "vehicle"
+            )
+        )
+        try:
+            tolerance = get_simplify_tolerance(request.POST)
+        except rest_serializers.ValidationError as e:
+            messages.error(request, e.detail[0])
+            return HttpResponseRedirect(request.META.get("HTTP_REFERER", "/"))
 
-        folium_map = folium.Map(tiles="OpenStreetMap")
-        all_points = []
-
-        for i, trip in enumerate(selected_trips):
-            # Проверка доступа (если пользователь не суперпользователь)
-            if not request.user.is_superuser:
-                manager = request.user.manager
-                if trip.vehicle.enterprise not in manager.enterprises.all():
-                    raise PermissionDenied("У вас нет доступа к этой поездке")
-
-            # Получаем все GPS точки для этой поездки
-            current_points = VehicleGPSPoint.objects.filter(
-                vehicle=trip.vehicle,
-                created_at__gte=trip.start_time,
-                created_at__lte=trip.end_time,
-            ).order_by("created_at")
-
-            all_trip_points = list(current_points)
-            all_trip_points.sort(key=lambda x: x.created_at)
-
-            if not all_trip_points:
-                continue
-
-            # Извлекаем координаты для маршрута
-            coordinates = [
-                (point.point.y, point.point.x) for point in all_trip_points
-            ]
-            all_points.extend(coordinates)
-
-            # Получаем цвет для этой поездки
-            color = colors[i]
-
-            # Добавляем трек на карту используя обычный PolyLine
-            folium.PolyLine(
-                locations=coordinates,
-                popup=f"Поездка {trip.vehicle.car_number}: {trip.start_time.strftime('%d.%m.%Y %H:%M')} - {trip.end_time.strftime('%d.%m.%Y %H:%M')}",
-                tooltip=f"Поездка {trip.vehicle.car_number}",
-                color=color,
-                weight=5,
-                opacity=0.8,
-            ).add_to(folium_map)
-
-            # Добавляем маркеры начала и конца поездки
-            if coordinates:
-                # Начальная точка
-                folium.Marker(
-                    location=coordinates[0],
-                    popup=f"Начало поездки {trip.id}: {trip.start_time.strftime('%d.%m.%Y %H:%M')}",
-                    icon=folium.Icon(color="green", icon="play"),
-                ).add_to(folium_map)
-
-                # Конечная точка
-                folium.Marker(
-                    location=coordinates[-1],
-                    popup=f"Конец поездки {trip.id}: {trip.end_time.strftime('%d.%m.%Y %H:%M')}",
-                    icon=folium.Icon(color="red", icon="stop"),
-                ).add_to(folium_map)
-        map_html = folium_map._repr_html_()
+        # Проверка доступа (если пользователь не суперпользователь)
+        if not request.user.is_superuser:
+            allowed_enterprise_ids = set(
+                request.user.manager.enterprises.values_list("id", flat=True)
+            )
+            if any(
+                trip.vehicle.enterprise_id not in allowed_enterprise_ids
+                for trip in selected_trips
+            ):
+                raise PermissionDenied("У вас нет доступа к этой поездке")
+
+        colors = self.get_distinct_colors_hex(len(selected_trips))
+        trips = []
+        for trip, color in zip(selected_trips, colors):
+            track_url = reverse("tracking:trip_track", args=[trip.id])
+            if tolerance:
+                track_url = f"{track_url}?tolerance={tolerance:g}"
+            trips.append(
+                {
+                    "id": trip.id,
+                    "car_number": trip.vehicle.car_number,
+                    "start_time": trip.start_time.strftime("%d.%m.%Y %H:%M"),
+                    "end_time": trip.end_time.strftime("%d.%m.%Y %H:%M"),
+                    "color": color,
+                    "track_url": track_url,
+                }
+            )
+        # Треки браузер загружает сам, по одному запросу на поездку
         return render(
             request,
             "trips/trip_map.html",
-            {"map_html": map_html, "selected_trips": selected_trips},
+            {"trips": trips, "selected_trips": selected_trips},
         )
 
 
+class TripTrackView(WebTripMixin, View):
+    """
+    Трек одной поездки для карты: encoded polyline (по умолчанию) или
+    GeoJSON LineString (format=geojson). Трек поездки меняется только при
+    пересчете поездки, поэтому ответ кэшируется на сервере и в браузере.
+    """
+
+    http_method_names = ["get"]
+    permission_required = ["tracking.view_trip"]
+
+    def get_queryset(self):
+        queryset = Trip.objects.all()
+        if self.request.user.is_superuser:
+            return queryset
+        return queryset.filter(
+            vehicle__enterprise__in=self.request.user.manager.enterprises.all()
+        )
+
+    def get_track(self, trip, tolerance, output_format):
+        points = get_trip_points(trip)
+        if tolerance:
+            points = filter_simplified_points(
+                points, Trip.objects.filter(pk=trip.pk), tolerance
+            )
+        rows = list(get_track_rows(points))
+        if output_format == "geojson":
+            return {
+                "type": "Feature",
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": [[point.x, point.y] for point, *_ in rows],
+                },
+                "properties": {"trip_id": trip.id, "point_count": len(rows)},
+            }
+        return {"trip_id": trip.id, **encode_polyline_track(rows)}
+
+    def get(self, request, trip_id, *args, **kwargs):
+        trip = get_object_or_404(self.get_queryset(), pk=trip_id)
+        output_format = request.GET.get("format", "polyline")
+        if output_format not in TRIP_TRACK_FORMATS:
+            return HttpResponseBadRequest(
+                "'format' must be one of: " + ", ".join(TRIP_TRACK_FORMATS)
+            )
+        try:
+            tolerance = get_simplify_tolerance(request.GET)
+        except rest_serializers.ValidationError as e:
+            return HttpResponseBadRequest(e.detail[0])
+
+        # point_count и end_time пересчитываются при изменении поездки,
+        # поэтому устаревший трек перестает совпадать по ключу
+        cache_key = (
+            f"trip_track_{output_format}_{trip.pk}_{trip.point_count}_"
+            f"{trip.end_time.timestamp():.0f}_{tolerance or 0:.3f}"
+        )
+        etag = quote_etag(cache_key)
+        if request.headers.get("If-None-Match") == etag:
+            response = HttpResponseNotModified()
+        else:
+            track = cache.get(cache_key)
+            if track is None:
+                track = self.get_track(trip, tolerance, output_format)
+                cache.set(cache_key, track, TRIP_TRACK_CACHE_TIMEOUT)
+            response = JsonResponse(track)
+        response["ETag"] = etag
+        patch_cache_control(
+            response, private=True, max_age=TRIP_TRACK_CACHE_TIMEOUT
+        )
+        return response
+
+
 class VehicleGPSPointViewSet(viewsets.ViewSet):
 
     permission_classes = [
@@ -215,13 +307,74 @@ class VehicleGPSPointViewSet(viewsets.ViewSet):
             created_at__date__gte=start_date,
             created_at__date__lte=end_date,
         )
-        if output_format == "geojson":
-            data = GeoJSONVehicleGPSPointSerializer(
-                current_points, many=True
-            ).data
-        else:
-            data = VehicleGPSPointSerializer(current_points, many=True).data
-        return Response(data)
+        if output_format in COMPACT_OUTPUT_FORMATS:
+            return compact_track_response(current_points, output_format)
+
+        serializer = get_gps_point_serializer(output_format, vehicle_id)
+        paginator = GPSPointCursorPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(
+                current_points, request, view=self
+            )
+            return paginator.get_paginated_response(
+                serializer.serialize_objects(page)
+            )
+        if is_stream_requested(request):
+            return gps_points_streaming_response(current_points, serializer)
+        return Response(serializer.serialize(current_points))
+
+
+class VehicleGPSPointTileView(APIView):
+    """Векторный тайл с GPS точками автомобилей предприятий менеджера"""
+
+    permission_classes = [
+        IsAuthenticated,
+        HasRoleOrSuper("manager"),
+    ]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Векторный тайл (MVT) с GPS точками за период. Даты считаются "
+            "в часовом поясе предприятия автомобиля"
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                "start_date",
+                openapi.IN_QUERY,
+                description="Дата начала (YYYY-MM-DD)",
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                required=True,
+            ),
+            openapi.Parameter(
+                "end_date",
+                openapi.IN_QUERY,
+                description="Дата окончания включительно (YYYY-MM-DD)",
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                required=True,
+            ),
+        ],
+        responses={200: "Mapbox Vector Tile, слой gps_points"},
+    )
+    def get(self, request, z, x, y):
+        validate_tile(z, x, y)
+        start_date, end_date = get_tile_dates(request.query_params)
+        enterprise_ids = None
+        if not request.user.is_superuser:
+            manager = Manager.objects.get(user=request.user)
+            enterprise_ids = list(
+                manager.enterprises.values_list("id", flat=True)
+            )
+        periods = get_tile_periods(start_date, end_date, enterprise_ids)
+        response = HttpResponse(
+            get_tile(z, x, y, periods, enterprise_ids),
+            content_type=MVT_CONTENT_TYPE,
+        )
+        patch_cache_control(
+            response, private=True, max_age=get_tile_cache_timeout(periods)
+        )
+        return response
 
 
 class TripViewSet(viewsets.ModelViewSet):
@@ -290,9 +443,40 @@ class TripGPSPointViewSet(viewsets.ViewSet):
                 openapi.IN_QUERY,
                 description="Формат вывода данных",
                 type=openapi.TYPE_STRING,
-                enum=["json", "geojson"],
+                enum=["json", "geojson", "polyline", "binary"],
                 default="json",
             ),
+            openapi.Parameter(
+                "tolerance",
+                openapi.IN_QUERY,
+                description="Допуск упрощения трека, метры",
+                type=openapi.TYPE_NUMBER,
+            ),
+            openapi.Parameter(
+                "zoom",
+                openapi.IN_QUERY,
+                description="Масштаб карты, допуск упрощения - один пиксель",
+                type=openapi.TYPE_INTEGER,
+            ),
+            openapi.Parameter(
+                "cursor",
+                openapi.IN_QUERY,
+                description="Курсор следующей страницы из поля next",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "page_size",
+                openapi.IN_QUERY,
+                description="Размер страницы. Вместе с cursor включает постраничную выдачу",
+                type=openapi.TYPE_INTEGER,
+            ),
+            openapi.Parameter(
+                "stream",
+                openapi.IN_QUERY,
+                description="Отдавать точки потоком, не собирая ответ в памяти",
+                type=openapi.TYPE_BOOLEAN,
+                default=False,
+            ),
         ],
         responses={
             200: openapi.Response(
@@ -387,40 +571,44 @@ class TripGPSPointViewSet(viewsets.ViewSet):
             end_time__lte=end_datetime_utc,
         ).order_by("start_time")
 
+        is_compact_format = output_format in COMPACT_OUTPUT_FORMATS
         if not trips.exists() and output_format == "geojson":
             return Response({"type": "FeatureCollection", "features": []})
-        elif not trips.exists():
+        elif not trips.exists() and not is_compact_format:
             return Response([{}])
 
-        query_current_points = VehicleGPSPoint.objects.none()
-        for trip in trips:
-
-            query_current_points = (
-                query_current_points
-                | VehicleGPSPoint.objects.filter(
-                    vehicle_id=vehicle_id,
-                    created_at__gte=trip.start_time,
-                    created_at__lte=trip.end_time,
-                )
+        # Точки выбираются по привязке к поездкам. Границы по created_at
+        # отсекают лишние партиции
+        query_all_tracks_points = VehicleGPSPoint.objects.filter(
+            trip__in=trips,
+            created_at__gte=start_datetime_utc,
+            created_at__lte=end_datetime_utc,
+        ).order_by("created_at")
+        tolerance = get_simplify_tolerance(request.query_params)
+        if tolerance:
+            query_all_tracks_points = filter_simplified_points(
+                query_all_tracks_points, trips, tolerance
             )
 
-        query_all_tracks_points = query_current_points.order_by("created_at")
-
-        if output_format == "geojson":
-            result_points = GeoJSONVehicleGPSPointSerializer(
-                query_all_tracks_points, many=True
-            ).data["features"]
-            return Response(
-                {
-                    "type": "FeatureCollection",
-                    "features": result_points,
-                }
+        if is_compact_format:
+            return compact_track_response(
+                query_all_tracks_points, output_format, group_by_trip=True
             )
 
-        result_points = VehicleGPSPointSerializer(
-            query_all_tracks_points, many=True
-        ).data
-        return Response(result_points)
+        serializer = get_gps_point_serializer(output_format, vehicle_id)
+        paginator = GPSPointCursorPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(
+                query_all_tracks_points, request, view=self
+            )
+            return paginator.get_paginated_response(
+                serializer.serialize_objects(page)
+            )
+        if is_stream_requested(request):
+            return gps_points_streaming_response(
+                query_all_tracks_points, serializer
+            )
+        return Response(serializer.serialize(query_all_tracks_points))
 
 
 class TripListViewSet(viewsets.ViewSet):
@@ -476,6 +664,12 @@ class TripListViewSet(viewsets.ViewSet):
             end_time__lte=end_datetime_utc,
         ).order_by("start_time")
 
+        paginator = TripCursorPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(trips, request, view=self)
+            serializer = TripSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
         serializer = TripSerializer(trips, many=True)
         return Response(serializer.data)
 
@@ -630,8 +824,6 @@ class ImportTripView(ImportView):
                         ),  # Point(lng, lat)
                         created_at=start_time,
                     )
-                    start_point.created_at = start_time
-                    start_point.save()
 
                 existing_end_point = None
                 if end_coords:
@@ -652,9 +844,8 @@ class ImportTripView(ImportView):
                         point=Point(
                             end_coords[1], end_coords[0]
                         ),  # Point(lng, lat)
+                        created_at=end_time,
                     )
-                    end_point.created_at = end_time
-                    end_point.save()
 
                 # Проверяем существование поездки
                 existing_trip = None
@@ -684,7 +875,7 @@ class ImportTripView(ImportView):
                     )
                     continue
                 if not existing_trip:
-                    Trip.objects.create(
+                    trip = Trip.objects.create(
                         uuid=trip_uuid,
                         vehicle=vehicle,
                         start_time=start_time,
@@ -695,14 +886,30 @@ class ImportTripView(ImportView):
                     created_count += 1
 
                 if not existing_trip and track_points:
-                    gps_points = [
-                        VehicleGPSPoint(vehicle=vehicle, point=Point(lng, lat))
-                        for lat, lng in [
-                            self.parse_coordinates(point)
-                            for point in track_points
-                        ]
-                    ]
+                    # Точки без времени ставим на начало поездки, чтобы они
+                    # остались внутри ее интервала
+                    track_point_times = row.get("track_point_times") or []
+                    tz = pytz.timezone(vehicle.enterprise.timezone)
+                    gps_points = []
+                    for i, point in enumerate(track_points):
+                        lat, lng = self.parse_coordinates(point)
+                        created_at = start_time
+                        if i < len(track_point_times) and track_point_times[i]:
+                            created_at = tz.localize(
+                                datetime.strptime(
+                                    track_point_times[i], "%Y-%m-%d %H:%M:%S"
+                                )
+                            )
+                        gps_points.append(
+                            VehicleGPSPoint(
+                                vehicle=vehicle,
+                                trip=trip,
+                                point=Point(lng, lat),
+                                created_at=created_at,
+                            )
+                        )
                     VehicleGPSPoint.objects.bulk_create(gps_points)
+                    update_trip_stats(trip)
 
             except Exception as e:
                 error_count += 1
@@ -1,5 +1,6 @@
 import asyncio
 import json
+import threading
 from datetime import datetime, timedelta
 
 import rx
@@ -12,20 +13,37 @@ from rx.subject import BehaviorSubject
 from apps.tracking.models import VehicleGPSPoint
 from apps.vehicles.models import Vehicle
 
+VEHICLE_STATUS_GROUP = "vehicle_status"
+STATUS_UPDATE_INTERVAL = 15
+
 
 class VehicleStatusTracker:
+    """
+    Считает статусы всех автомобилей раз в STATUS_UPDATE_INTERVAL секунд и
+    рассылает изменения в группу VEHICLE_STATUS_GROUP. В процессе работает
+    один трекер на все WebSocket подключения (см. acquire_status_tracker)
+    """
 
     def __init__(self):
         self.vehicle_statuses = BehaviorSubject({})
         self.channel_layer = get_channel_layer()
-        self.update_trigger = rx.interval(15)
+        # Первый расчет сразу, чтобы новые клиенты не ждали интервал
+        self.update_trigger = rx.timer(0, STATUS_UPDATE_INTERVAL)
+        self._subscription = None
+
+    def start(self):
+        if self._subscription is None:
+            self._subscription = self._setup_status_pipeline()
 
-        self._setup_status_pipeline()
+    def stop(self):
+        if self._subscription is not None:
+            self._subscription.dispose()
+            self._subscription = None
 
     def _setup_status_pipeline(self):
         """Настройка pipeline статусов"""
 
-        self.update_trigger.pipe(
+        return self.update_trigger.pipe(
             # Получение статусов всех автомобилей
             ops.map(lambda _: self._calculate_all_statuses()),
             # Сравнение с предыдущими статусами
@@ -49,15 +67,14 @@ class VehicleStatusTracker:
         now = datetime.now()
 
         latest_gps_points = (
-            VehicleGPSPoint.objects.select_related("vehicle")
-            .filter(vehicle__in=Vehicle.objects.all())
-            .order_by("vehicle", "-created_at")
+            VehicleGPSPoint.objects.order_by("vehicle", "-created_at")
             .distinct("vehicle")
+            .only("vehicle_id", "created_at")
         )
 
         latest_gps_dict = {gps.vehicle_id: gps for gps in latest_gps_points}
 
-        vehicles = Vehicle.objects.all()
+        vehicles = Vehicle.objects.only("id")
         for vehicle in vehicles:
             latest_gps = latest_gps_dict.get(vehicle.id)
             status_info = self._determine_vehicle_status(
@@ -156,7 +173,7 @@ class VehicleStatusTracker:
         # WebSocket уведомления
         for change in changes["changed"]:
             async_to_sync(self.channel_layer.group_send)(
-                "vehicle_status",
+                VEHICLE_STATUS_GROUP,
                 {
                     "type": "status_change",
                     "vehicle_id": change["vehicle_id"],
@@ -181,17 +198,60 @@ class VehicleStatusTracker:
         return self.vehicle_statuses.subscribe(callback)
 
 
+_status_tracker = None
+_status_tracker_users = 0
+_status_tracker_lock = threading.Lock()
+
+
+def acquire_status_tracker():
+    """
+    Общий трекер процесса. Запускается при первом подключении и
+    останавливается в release_status_tracker после последнего отключения
+    """
+    global _status_tracker, _status_tracker_users
+    with _status_tracker_lock:
+        if _status_tracker is None:
+            _status_tracker = VehicleStatusTracker()
+            _status_tracker.start()
+        _status_tracker_users += 1
+        return _status_tracker
+
+
+def release_status_tracker():
+    global _status_tracker, _status_tracker_users
+    with _status_tracker_lock:
+        if _status_tracker is None:
+            return
+        _status_tracker_users -= 1
+        if _status_tracker_users <= 0:
+            _status_tracker.stop()
+            _status_tracker = None
+            _status_tracker_users = 0
+
+
 # WebSocket Consumer
 class VehicleStatusConsumer(AsyncWebsocketConsumer):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.status_tracker = VehicleStatusTracker()
+        self.status_tracker = None
+        self.ping_task = None
 
     async def connect(self):
-        await self.channel_layer.group_add("vehicle_status", self.channel_name)
+        await self.channel_layer.group_add(
+            VEHICLE_STATUS_GROUP, self.channel_name
+        )
         await self.accept()
-        asyncio.create_task(self.send_ping())
+        self.status_tracker = acquire_status_tracker()
+        # Статусы, уже посчитанные для других клиентов
+        statuses = self.status_tracker.get_all_statuses()
+        if statuses:
+            await self.send(
+                text_data=json.dumps(
+                    {"type": "initial_statuses", "statuses": statuses}
+                )
+            )
+        self.ping_task = asyncio.create_task(self.send_ping())
 
     async def send_ping(self):
         while True:
@@ -202,8 +262,14 @@ class VehicleStatusConsumer(AsyncWebsocketConsumer):
                 break
 
     async def disconnect(self, close_code):
+        if self.ping_task is not None:
+            self.ping_task.cancel()
+            self.ping_task = None
+        if self.status_tracker is not None:
+            release_status_tracker()
+            self.status_tracker = None
         await self.channel_layer.group_discard(
-            "vehicle_status", self.channel_name
+            VEHICLE_STATUS_GROUP, self.channel_name
         )
 
     async def status_change(self, event):
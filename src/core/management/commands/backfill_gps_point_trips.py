@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from apps.tracking.services import (
+    assign_trip_points,
+    get_trips_with_unlinked_points,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Link GPS points to the trips whose interval they fall into. "
+        "Run before backfill_trip_stats, which counts only linked points"
+    )
+    CONSOLE_PRINT_INTERVAL = 100
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--vehicle-id",
+            type=int,
+            default=None,
+            help="Only trips of this vehicle",
+        )
+
+    def handle(self, *args, **options):
+        # Поездки, где все точки уже привязаны, пропускаются, поэтому
+        # повторный запуск почти ничего не стоит
+        trips = get_trips_with_unlinked_points().order_by("id")
+        if options["vehicle_id"] is not None:
+            trips = trips.filter(vehicle_id=options["vehicle_id"])
+
+        total = trips.count()
+        linked_count = 0
+        for i, trip in enumerate(trips.iterator(), start=1):
+            linked_count += assign_trip_points(trip)
+            if i % self.CONSOLE_PRINT_INTERVAL == 0 or i == total:
+                self.stdout.write(f"Processed {i}/{total} trips")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Linked {linked_count} GPS points to {total} trips"
+            )
+        )
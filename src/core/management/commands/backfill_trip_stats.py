@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef, Q
+
+from apps.tracking.models import Trip, VehicleGPSPoint
+from apps.tracking.services import (
+    get_trips_with_unlinked_points,
+    update_trip_stats,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Calculate distance, point count and speed statistics of trips. "
+        "Run after backfill_gps_point_trips, the statistics count only "
+        "points linked to the trip"
+    )
+    CONSOLE_PRINT_INTERVAL = 100
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recalculate all trips, not only trips without statistics",
+        )
+        parser.add_argument(
+            "--vehicle-id",
+            type=int,
+            default=None,
+            help="Only trips of this vehicle",
+        )
+
+    def handle(self, *args, **options):
+        trips = Trip.objects.select_related("vehicle__enterprise").order_by(
+            "id"
+        )
+        if options["vehicle_id"] is not None:
+            trips = trips.filter(vehicle_id=options["vehicle_id"])
+
+        # Без привязанных точек статистика записалась бы нулевой, и такие
+        # поездки больше не попали бы в выборку
+        unlinked_count = get_trips_with_unlinked_points(trips).count()
+        if unlinked_count:
+            raise CommandError(
+                f"{unlinked_count} trips have GPS points that are not linked "
+                "to them, run backfill_gps_point_trips first"
+            )
+
+        if not options["all"]:
+            # Нулевая статистика при привязанных точках осталась от запуска
+            # до backfill_gps_point_trips
+            has_points = Exists(
+                VehicleGPSPoint.objects.filter(trip_id=OuterRef("pk"))
+            )
+            trips = trips.filter(
+                Q(distance_km__isnull=True) | Q(has_points, point_count=0)
+            )
+
+        total = trips.count()
+        for i, trip in enumerate(trips.iterator(), start=1):
+            update_trip_stats(trip)
+            if i % self.CONSOLE_PRINT_INTERVAL == 0 or i == total:
+                self.stdout.write(f"Processed {i}/{total} trips")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Trip statistics updated for {total} trips")
+        )
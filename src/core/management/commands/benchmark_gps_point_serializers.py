@@ -0,0 +1,93 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from apps.tracking.models import VehicleGPSPoint
+from apps.tracking.serializers import (
+    GeoJSONVehicleGPSPointSerializer,
+    GeoJSONVehicleGPSPointValuesSerializer,
+    VehicleGPSPointSerializer,
+    VehicleGPSPointValuesSerializer,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF GPS point serializers with the values_list based ones "
+        "on existing points and check that the rendered JSON is identical"
+    )
+    REPEATS = 5
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--vehicle-id",
+            type=int,
+            default=None,
+            help="Vehicle to take points from, the one with the first point "
+            "by default",
+        )
+        parser.add_argument(
+            "--points",
+            type=int,
+            default=50_000,
+            help="Number of latest points to serialize",
+        )
+
+    def handle(self, *args, **options):
+        vehicle_id = options["vehicle_id"]
+        if vehicle_id is None:
+            first_point = VehicleGPSPoint.objects.order_by("id").first()
+            if first_point is None:
+                raise CommandError("There are no GPS points to serialize")
+            vehicle_id = first_point.vehicle_id
+
+        latest_ids = list(
+            VehicleGPSPoint.objects.filter(vehicle_id=vehicle_id)
+            .order_by("-created_at")
+            .values_list("id", flat=True)[: options["points"]]
+        )
+        points = VehicleGPSPoint.objects.filter(id__in=latest_ids).order_by(
+            "created_at", "id"
+        )
+
+        renderer = JSONRenderer()
+        pairs = {
+            "json": (
+                lambda: VehicleGPSPointSerializer(points, many=True).data,
+                lambda: VehicleGPSPointValuesSerializer.for_vehicle(
+                    vehicle_id
+                ).serialize(points),
+            ),
+            "geojson": (
+                lambda: GeoJSONVehicleGPSPointSerializer(
+                    points, many=True
+                ).data,
+                lambda: GeoJSONVehicleGPSPointValuesSerializer.for_vehicle(
+                    vehicle_id
+                ).serialize(points),
+            ),
+        }
+        for output_format, (drf_serialize, fast_serialize) in pairs.items():
+            drf_time, drf_output = self.measure(drf_serialize, renderer)
+            fast_time, fast_output = self.measure(fast_serialize, renderer)
+            self.stdout.write(
+                f"{output_format}: {len(latest_ids)} points, "
+                f"DRF median {drf_time * 1000:.1f} ms, "
+                f"values median {fast_time * 1000:.1f} ms, "
+                f"speedup {drf_time / fast_time:.1f}x"
+            )
+            if drf_output == fast_output:
+                self.stdout.write(self.style.SUCCESS("  output is identical"))
+            else:
+                self.stdout.write(self.style.ERROR("  output differs"))
+
+    def measure(self, serialize, renderer):
+        """Медиана времени сериализации с рендерингом в JSON"""
+        timings = []
+        for _ in range(self.REPEATS):
+            started_at = time.perf_counter()
+            output = renderer.render(serialize())
+            timings.append(time.perf_counter() - started_at)
+        return statistics.median(timings), output
@@ -0,0 +1,152 @@
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from apps.tracking.models import VehicleGPSPoint
+from apps.vehicles.models import Vehicle
+
+
+class RollbackBenchmark(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure GPS point insert speed and typical range scans. "
+        "Generated points are rolled back after the run"
+    )
+    REPEATS = 5
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--points",
+            type=int,
+            default=100_000,
+            help="Number of points to insert",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Points per bulk_create batch",
+        )
+        parser.add_argument(
+            "--vehicles",
+            type=int,
+            default=10,
+            help="Number of existing vehicles to spread points between",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Points are spread over this many last days",
+        )
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Print query plans of the range scans",
+        )
+
+    def handle(self, *args, **options):
+        vehicle_ids = list(
+            Vehicle.objects.order_by("id").values_list("id", flat=True)[
+                : options["vehicles"]
+            ]
+        )
+        if not vehicle_ids:
+            raise CommandError("At least one vehicle is required")
+
+        self.explain = options["explain"]
+        end = datetime.now(timezone.utc)
+        start = end - timedelta(days=options["days"])
+        try:
+            with transaction.atomic():
+                self.benchmark_insert(
+                    vehicle_ids,
+                    start,
+                    end,
+                    options["points"],
+                    options["batch_size"],
+                )
+                if connection.vendor == "postgresql":
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            f"ANALYZE {VehicleGPSPoint._meta.db_table}"
+                        )
+                self.benchmark_range_scans(vehicle_ids[0], start, end)
+                raise RollbackBenchmark()
+        except RollbackBenchmark:
+            pass
+
+    def generate_points(self, vehicle_ids, start, end, count):
+        step = (end - start) / count
+        positions = {
+            vehicle_id: (random.uniform(37.3, 37.9), random.uniform(55.5, 55.9))
+            for vehicle_id in vehicle_ids
+        }
+        for i in range(count):
+            vehicle_id = vehicle_ids[i % len(vehicle_ids)]
+            lng, lat = positions[vehicle_id]
+            lng += random.uniform(-0.0005, 0.0005)
+            lat += random.uniform(-0.0005, 0.0005)
+            positions[vehicle_id] = (lng, lat)
+            yield VehicleGPSPoint(
+                vehicle_id=vehicle_id,
+                point=Point(lng, lat),
+                created_at=start + step * i,
+                speed=random.uniform(0, 90),
+            )
+
+    def benchmark_insert(self, vehicle_ids, start, end, count, batch_size):
+        batch = []
+        started_at = time.perf_counter()
+        for gps_point in self.generate_points(vehicle_ids, start, end, count):
+            batch.append(gps_point)
+            if len(batch) >= batch_size:
+                VehicleGPSPoint.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            VehicleGPSPoint.objects.bulk_create(batch)
+        elapsed = time.perf_counter() - started_at
+        self.stdout.write(
+            f"Insert: {count} points in {elapsed:.2f} s "
+            f"({count / elapsed:.0f} points/s)"
+        )
+
+    def benchmark_range_scans(self, vehicle_id, start, end):
+        middle = start + (end - start) / 2
+        center = VehicleGPSPoint.objects.filter(vehicle_id=vehicle_id).first()
+        scans = {
+            "Vehicle day range": VehicleGPSPoint.objects.filter(
+                vehicle_id=vehicle_id,
+                created_at__gte=middle,
+                created_at__lt=middle + timedelta(days=1),
+            ).order_by("created_at"),
+            "Fleet hour range": VehicleGPSPoint.objects.filter(
+                created_at__gte=middle,
+                created_at__lt=middle + timedelta(hours=1),
+            ),
+            "Proximity (~1 km)": VehicleGPSPoint.objects.filter(
+                point__dwithin=(center.point, 0.01)
+            ),
+        }
+        for name, queryset in scans.items():
+            timings = []
+            for _ in range(self.REPEATS):
+                started_at = time.perf_counter()
+                rows_count = len(queryset.values_list("id", "created_at"))
+                timings.append(time.perf_counter() - started_at)
+            self.stdout.write(
+                f"{name}: {rows_count} rows, "
+                f"median {statistics.median(timings) * 1000:.1f} ms"
+            )
+            if self.explain and connection.vendor == "postgresql":
+                self.stdout.write(queryset.explain(analyze=True))
+            elif self.explain:
+                self.stdout.write(queryset.explain())
@@ -0,0 +1,133 @@
+from datetime import datetime, time, timedelta, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.tracking.geometry import simplify_track_indices
+from apps.tracking.models import Trip, VehicleGPSPoint
+from apps.tracking.services import update_trip_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace raw GPS points older than the given age with a simplified "
+        "track per vehicle and day. Trip start and end points are kept, "
+        "statistics of the affected trips are recalculated. "
+        "Intended to run daily, e.g. from cron"
+    )
+    DELETE_CHUNK_SIZE = 5000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=settings.GPS_POINTS_DOWNSAMPLE_AFTER_DAYS,
+            help="Only days older than this many days are downsampled",
+        )
+        parser.add_argument(
+            "--window-days",
+            type=int,
+            default=7,
+            help="How many days before the age limit to process",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=settings.GPS_POINTS_DOWNSAMPLE_TOLERANCE_M,
+            help="Maximum deviation of the simplified track in meters",
+        )
+
+    def handle(self, *args, **options):
+        tolerance = options["tolerance"]
+        today = datetime.now(timezone.utc).date()
+        last_day = today - timedelta(days=options["older_than_days"] + 1)
+        first_day = last_day - timedelta(days=options["window_days"] - 1)
+
+        total_deleted = 0
+        day = first_day
+        while day <= last_day:
+            day_start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+            day_end = day_start + timedelta(days=1)
+            vehicle_ids = (
+                VehicleGPSPoint.objects.filter(
+                    created_at__gte=day_start, created_at__lt=day_end
+                )
+                .order_by()
+                .values_list("vehicle_id", flat=True)
+                .distinct()
+            )
+            for vehicle_id in vehicle_ids:
+                total_deleted += self.downsample_vehicle_day(
+                    vehicle_id, day_start, day_end, tolerance
+                )
+            day += timedelta(days=1)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Downsampled {first_day} - {last_day}: "
+                f"deleted {total_deleted} GPS points"
+            )
+        )
+
+    def get_day_trips(self, vehicle_id, day_start, day_end):
+        return Trip.objects.filter(
+            vehicle_id=vehicle_id,
+            start_time__lt=day_end,
+            end_time__gte=day_start,
+        )
+
+    def get_protected_point_ids(self, trips):
+        return {
+            point_id
+            for trip_point_ids in trips.values_list(
+                "start_point_id", "end_point_id"
+            )
+            for point_id in trip_point_ids
+            if point_id is not None
+        }
+
+    def downsample_vehicle_day(self, vehicle_id, day_start, day_end, tolerance):
+        points = list(
+            VehicleGPSPoint.objects.filter(
+                vehicle_id=vehicle_id,
+                created_at__gte=day_start,
+                created_at__lt=day_end,
+            )
+            .order_by("created_at", "id")
+            .values_list("id", "point")
+        )
+        kept_indices = set(
+            simplify_track_indices(
+                [(point.x, point.y) for _, point in points], tolerance
+            )
+        )
+        trips = self.get_day_trips(vehicle_id, day_start, day_end)
+        protected_ids = self.get_protected_point_ids(trips)
+        dropped_ids = [
+            point_id
+            for index, (point_id, _) in enumerate(points)
+            if index not in kept_indices and point_id not in protected_ids
+        ]
+        if not dropped_ids:
+            return 0
+
+        # Точки, на которые ссылаются поездки, исключены выше, поэтому
+        # удаление без Collector безопасно и не загружает точки в память
+        table = VehicleGPSPoint._meta.db_table
+        day_start = connection.ops.adapt_datetimefield_value(day_start)
+        day_end = connection.ops.adapt_datetimefield_value(day_end)
+        with transaction.atomic(), connection.cursor() as cursor:
+            for i in range(0, len(dropped_ids), self.DELETE_CHUNK_SIZE):
+                chunk = dropped_ids[i : i + self.DELETE_CHUNK_SIZE]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE created_at >= %s "
+                    f"AND created_at < %s AND id IN ({placeholders})",
+                    [day_start, day_end, *chunk],
+                )
+            # Количество точек входит в ключ кэша и ETag трека поездки,
+            # а пробег - в суточную статистику
+            for trip in trips.select_related("vehicle__enterprise"):
+                update_trip_stats(trip)
+        return len(dropped_ids)
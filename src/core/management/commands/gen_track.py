@@ -110,14 +110,16 @@ class Command(BaseCommand):
             for i, point_coords in enumerate(route_points):
                 point = Point(point_coords[0], point_coords[1])
 
-                gps_point = VehicleGPSPoint(vehicle=vehicle, point=point)
-                gps_point.save()
                 gps_point_created_at = gps_point_created_at + (
                     datetime.now(timezone.utc)
                     - begin_of_execution_time
                     + timedelta(seconds=30)
                 )
-                gps_point.created_at = gps_point_created_at
+                gps_point = VehicleGPSPoint(
+                    vehicle=vehicle,
+                    point=point,
+                    created_at=gps_point_created_at,
+                )
                 gps_point.save()
 
                 if start_point is None:
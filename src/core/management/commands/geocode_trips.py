@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+from prometheus_client import start_http_server
+
+from apps.tracking.geocoding import geocode_pending_trips
+
+
+class Command(BaseCommand):
+    help = "Resolve start and end addresses of trips in the background"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Trips per batch",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=10,
+            help="Seconds to wait when there is nothing to geocode",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            default=None,
+            help="Serve Prometheus metrics of the worker on this port",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process pending trips and exit",
+        )
+
+    def handle(self, *args, **options):
+        # Метрики воркера не видны через /prometheus/ веб-процесса
+        if options["metrics_port"]:
+            start_http_server(options["metrics_port"])
+
+        total = 0
+        while True:
+            geocoded_count = geocode_pending_trips(options["batch_size"])
+            total += geocoded_count
+            if geocoded_count:
+                self.stdout.write(f"Geocoded {total} trips")
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"Geocoded {total} trips"))
@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+
+from apps.tracking import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create monthly partitions of GPS points ahead of time and "
+        "detach or drop partitions older than the retention period"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=3,
+            help="How many future months must have partitions",
+        )
+        parser.add_argument(
+            "--retention-months",
+            type=int,
+            default=None,
+            help="Detach partitions of months older than this many months",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help=(
+                "Drop old partitions instead of keeping them as tables "
+                "without foreign keys"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported():
+            self.stdout.write(
+                self.style.WARNING(
+                    "GPS points are partitioned only on PostgreSQL, nothing to do"
+                )
+            )
+            return
+
+        created = partitions.ensure_partitions(options["months_ahead"])
+        for name in created:
+            self.stdout.write(self.style.SUCCESS(f"Created partition {name}"))
+
+        retention_months = options["retention_months"]
+        if retention_months is None:
+            return
+        current_month = partitions.month_start(datetime.now(timezone.utc))
+        oldest_kept_month = partitions.add_months(
+            current_month, -retention_months
+        )
+        detached = partitions.detach_partitions_before(
+            oldest_kept_month, drop=options["drop"]
+        )
+        action = "Dropped" if options["drop"] else "Detached"
+        for name in detached:
+            self.stdout.write(self.style.SUCCESS(f"{action} partition {name}"))
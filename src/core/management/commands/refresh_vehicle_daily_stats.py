@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.tracking.models import Trip
+from apps.tracking.services import refresh_vehicle_daily_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild daily vehicle mileage statistics from trips. "
+        "Run after backfill_trip_stats, trips without statistics "
+        "would be counted with zero mileage"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=2,
+            help="Rebuild this many last days including today",
+        )
+        parser.add_argument(
+            "--start-date",
+            type=date.fromisoformat,
+            default=None,
+            help="First date to rebuild (YYYY-MM-DD), overrides --days",
+        )
+        parser.add_argument(
+            "--end-date",
+            type=date.fromisoformat,
+            default=None,
+            help="Last date to rebuild (YYYY-MM-DD), today by default",
+        )
+        parser.add_argument(
+            "--vehicle-id",
+            type=int,
+            action="append",
+            default=None,
+            help="Only this vehicle, can be repeated",
+        )
+
+    def handle(self, *args, **options):
+        # Локальная дата предприятий может опережать UTC на сутки
+        end_date = options["end_date"] or (
+            timezone.now().date() + timedelta(days=1)
+        )
+        start_date = options["start_date"] or (
+            end_date - timedelta(days=options["days"])
+        )
+        if start_date > end_date:
+            raise CommandError("--start-date must not be after --end-date")
+
+        trips_without_stats = Trip.objects.filter(distance_km__isnull=True)
+        if options["vehicle_id"]:
+            trips_without_stats = trips_without_stats.filter(
+                vehicle_id__in=options["vehicle_id"]
+            )
+        if trips_without_stats.exists():
+            raise CommandError(
+                "Some trips have no statistics yet, "
+                "run backfill_trip_stats first"
+            )
+
+        saved_count = refresh_vehicle_daily_stats(
+            start_date, end_date, vehicle_ids=options["vehicle_id"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Daily statistics rebuilt for {start_date} - {end_date}: "
+                f"{saved_count} rows"
+            )
+        )
@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.tracking.consumers.worker import GPSConsumerWorker
+
+
+def run_worker(name):
+    # Дочерний процесс не должен использовать соединения родителя
+    connections.close_all()
+    worker = GPSConsumerWorker(name=name)
+    worker.install_signal_handlers()
+    worker.run()
+
+
+class Command(BaseCommand):
+    help = (
+        "Start a pool of GPS consumer processes in one Kafka consumer group. "
+        "Kafka assigns each worker its own subset of topic partitions."
+    )
+    SUPERVISE_INTERVAL = 1
+    SHUTDOWN_TIMEOUT = 30
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.GPS_CONSUMER_WORKERS or os.cpu_count(),
+            help="Number of worker processes",
+        )
+
+    def handle(self, *args, **options):
+        workers_count = max(1, options["workers"])
+        self.context = multiprocessing.get_context("fork")
+        self.stopping = False
+        self.workers = {}
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        connections.close_all()
+        for index in range(workers_count):
+            self.start_worker(f"gps-consumer-{index}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Started {workers_count} GPS consumers")
+        )
+
+        while not self.stopping:
+            time.sleep(self.SUPERVISE_INTERVAL)
+            self.restart_exited_workers()
+
+        self.shutdown()
+
+    def restart_exited_workers(self):
+        for name, process in list(self.workers.items()):
+            if process.is_alive() or self.stopping:
+                continue
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{name} exited with code {process.exitcode}, restarting"
+                )
+            )
+            self.start_worker(name)
+
+    def start_worker(self, name):
+        process = self.context.Process(
+            target=run_worker, args=(name,), name=name
+        )
+        process.start()
+        self.workers[name] = process
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def shutdown(self):
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + self.SHUTDOWN_TIMEOUT
+        for name, process in self.workers.items():
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                self.stdout.write(
+                    self.style.ERROR(f"{name} did not stop in time, killing")
+                )
+                process.kill()
+                process.join()
+        self.stdout.write(self.style.SUCCESS("GPS consumers stopped"))
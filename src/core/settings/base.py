@@ -180,8 +180,81 @@ SWAGGER_SETTINGS = {
 }
 
 GEOPIFY_API_KEY = os.getenv("GEOPIFY_API_KEY")
+# Провайдер обратного геокодирования адресов поездок (команда geocode_trips)
+GEOCODING_PROVIDER = os.getenv(
+    "GEOCODING_PROVIDER", "apps.tracking.geocoding.GeoapifyProvider"
+)
+GEOCODING_CONNECT_TIMEOUT = float(
+    os.getenv("GEOCODING_CONNECT_TIMEOUT", "2")
+)
+GEOCODING_READ_TIMEOUT = float(os.getenv("GEOCODING_READ_TIMEOUT", "5"))
+GEOCODING_POOL_SIZE = int(os.getenv("GEOCODING_POOL_SIZE", "10"))
+# После стольких ошибок подряд провайдер не вызывается RESET_TIMEOUT секунд
+GEOCODING_CIRCUIT_FAILURE_THRESHOLD = int(
+    os.getenv("GEOCODING_CIRCUIT_FAILURE_THRESHOLD", "5")
+)
+GEOCODING_CIRCUIT_RESET_TIMEOUT = float(
+    os.getenv("GEOCODING_CIRCUIT_RESET_TIMEOUT", "30")
+)
+# Адреса кэшируются по ячейкам geohash, точность 8 - около 38 x 19 м
+GEOCODING_GEOHASH_PRECISION = int(
+    os.getenv("GEOCODING_GEOHASH_PRECISION", "8")
+)
+# Задержка перед повторным геокодированием поездки (сек.) удваивается с
+# каждой неудачной попыткой, но не больше максимальной
+GEOCODING_RETRY_BASE_DELAY = int(
+    os.getenv("GEOCODING_RETRY_BASE_DELAY", "60")
+)
+GEOCODING_RETRY_MAX_DELAY = int(
+    os.getenv("GEOCODING_RETRY_MAX_DELAY", "86400")
+)
 GRAPHHOPPER_API_KEY = os.getenv("GRAPHHOPPER_API_KEY")
 
+KAFKA_BOOTSTRAP_SERVERS = os.getenv(
+    "KAFKA_BOOTSTRAP_SERVERS", "kafka:9092"
+).split(",")
+GPS_POINTS_TOPIC = "gps_points"
+GPS_POINTS_DEAD_LETTER_TOPIC = "gps_points_dead_letter"
+GPS_CONSUMER_GROUP_ID = os.getenv("GPS_CONSUMER_GROUP_ID", "gps_points_writers")
+# Точки пишутся в БД пачками: по достижении размера или по таймауту (сек.)
+GPS_CONSUMER_BATCH_SIZE = int(os.getenv("GPS_CONSUMER_BATCH_SIZE", "500"))
+GPS_CONSUMER_BATCH_INTERVAL = float(
+    os.getenv("GPS_CONSUMER_BATCH_INTERVAL", "1.0")
+)
+# Количество процессов run_gps_consumers, по умолчанию - число ядер.
+# Воркеров больше, чем партиций топика, запускать бессмысленно
+GPS_CONSUMER_WORKERS = int(os.getenv("GPS_CONSUMER_WORKERS", "0"))
+# Как часто консьюмер проверяет наличие секций GPS точек на ближайшие
+# месяцы (сек.)
+GPS_PARTITIONS_CHECK_INTERVAL = int(
+    os.getenv("GPS_PARTITIONS_CHECK_INTERVAL", "3600")
+)
+# Как часто консьюмер перечитывает id существующих автомобилей (сек.)
+GPS_CONSUMER_VEHICLE_CACHE_TTL = int(
+    os.getenv("GPS_CONSUMER_VEHICLE_CACHE_TTL", "300")
+)
+
+# Сырые GPS точки старше этого возраста (дни) заменяются упрощенным треком
+GPS_POINTS_DOWNSAMPLE_AFTER_DAYS = int(
+    os.getenv("GPS_POINTS_DOWNSAMPLE_AFTER_DAYS", "30")
+)
+# Допустимое отклонение упрощенного трека от исходного, метры
+GPS_POINTS_DOWNSAMPLE_TOLERANCE_M = float(
+    os.getenv("GPS_POINTS_DOWNSAMPLE_TOLERANCE_M", "10")
+)
+# Сколько точек читается из БД и пишется в ответ за раз при stream=true
+GPS_POINTS_STREAM_CHUNK_SIZE = int(
+    os.getenv("GPS_POINTS_STREAM_CHUNK_SIZE", "2000")
+)
+# Максимальная длина периода (дни) для векторных тайлов с GPS точками
+GPS_TILES_MAX_PERIOD_DAYS = int(os.getenv("GPS_TILES_MAX_PERIOD_DAYS", "31"))
+# Время жизни тайла в кэше (сек.): для закрытого периода и для периода,
+# в который еще приходят точки
+GPS_TILES_CACHE_TIMEOUT = int(os.getenv("GPS_TILES_CACHE_TIMEOUT", "86400"))
+GPS_TILES_LIVE_CACHE_TIMEOUT = int(
+    os.getenv("GPS_TILES_LIVE_CACHE_TIMEOUT", "60")
+)
+
 ASGI_APPLICATION = "core.asgi.application"
 CHANNEL_LAYERS = {
     "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
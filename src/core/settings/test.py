@@ -14,4 +14,5 @@ DATABASES = {
 STATICFILES_STORAGE = "django.contrib.staticfiles.storage.StaticFilesStorage"
 GRAPHHOPPER_API_KEY = "test_key"
 GEOPIFY_API_KEY = "test_key"
+GEOCODING_PROVIDER = "apps.tracking.geocoding.StubGeocodingProvider"
 ALLOWED_HOSTS = ["*"]
@@ -0,0 +1,70 @@
+// Декодирование Google encoded polyline в массив [lat, lng]
+function decodePolyline(encoded, precision) {
+  var factor = Math.pow(10, precision === undefined ? 5 : precision);
+  var coordinates = [];
+  var index = 0, lat = 0, lng = 0;
+
+  function nextValue() {
+    var result = 0, shift = 0, byte;
+    do {
+      byte = encoded.charCodeAt(index++) - 63;
+      result |= (byte & 0x1f) << shift;
+      shift += 5;
+    } while (byte >= 0x20);
+    return (result & 1) ? ~(result >> 1) : (result >> 1);
+  }
+
+  while (index < encoded.length) {
+    lat += nextValue();
+    lng += nextValue();
+    coordinates.push([lat / factor, lng / factor]);
+  }
+  return coordinates;
+}
+
+// Карта поездок: треки загружаются отдельно для каждой поездки
+class TripMap {
+  constructor(containerId, trips) {
+    this.map = L.map(containerId).setView([55.75, 37.62], 10);
+    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+      attribution: '&copy; OpenStreetMap contributors'
+    }).addTo(this.map);
+    this.bounds = L.latLngBounds([]);
+    trips.forEach((trip) => this.loadTrip(trip));
+  }
+
+  async loadTrip(trip) {
+    try {
+      const response = await fetch(trip.track_url, {
+        credentials: 'same-origin'
+      });
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      const track = await response.json();
+      this.drawTrip(trip, decodePolyline(track.polyline, track.precision));
+    } catch (error) {
+      console.error(`Failed to load track for trip ${trip.id}:`, error);
+    }
+  }
+
+  drawTrip(trip, coordinates) {
+    if (!coordinates.length) return;
+
+    L.polyline(coordinates, { color: trip.color, weight: 5, opacity: 0.8 })
+      .bindPopup(`Поездка ${trip.car_number}: ${trip.start_time} - ${trip.end_time}`)
+      .bindTooltip(`Поездка ${trip.car_number}`)
+      .addTo(this.map);
+
+    L.circleMarker(coordinates[0], { color: 'green', radius: 7 })
+      .bindPopup(`Начало поездки ${trip.id}: ${trip.start_time}`)
+      .addTo(this.map);
+    L.circleMarker(coordinates[coordinates.length - 1], { color: 'red', radius: 7 })
+      .bindPopup(`Конец поездки ${trip.id}: ${trip.end_time}`)
+      .addTo(this.map);
+
+    // Карта подстраивается под уже загруженные треки
+    this.bounds.extend(coordinates);
+    this.map.fitBounds(this.bounds, { padding: [20, 20] });
+  }
+}